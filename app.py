@@ -5,21 +5,32 @@ Sistema Web de Gerenciamento de Precatórios - Versão Vercel
 Interface web para visualizar e editar dados como uma planilha Excel
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, Response, make_response, stream_with_context
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from psycopg2 import ProgrammingError
 import logging
+import threading
+import weakref
 from datetime import datetime, timezone, timedelta, date
+from decimal import Decimal, InvalidOperation
 import json
+import functools
+from contextlib import contextmanager
+import hashlib
+import hmac
 import os
 import re
 import time
 import csv
-from collections import defaultdict
+import io
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+import traceback
 import unicodedata
 import math
-from typing import Dict, List, Any, Optional
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 # Configurar logging otimizado para Vercel
 logging.basicConfig(
@@ -31,6 +42,7 @@ logger = logging.getLogger(__name__)
 # Configuração do Flask otimizada para Vercel
 # Configurar caminhos absolutos para templates e static quando executado via api/index.py
 from pathlib import Path
+from jinja2 import FileSystemBytecodeCache
 
 # Obter o diretório base do projeto (raiz do workspace)
 base_dir = Path(__file__).parent.absolute()
@@ -43,21 +55,47 @@ app = Flask(
 app.secret_key = os.environ.get('SECRET_KEY', 'sua_chave_secreta_aqui')
 ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', 'admin')
 
+# Bytecode dos templates em disco: uma instância nova (cold start do Vercel) reaproveita
+# a compilação do index.html feita por outra invocação em vez de recompilar o Jinja
+JINJA_CACHE_DIR = os.path.join(os.environ.get('SNAPSHOT_DIR', '/tmp'), 'jinja_cache')
+try:
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+except OSError as e:
+    logger.warning(f"Cache de bytecode dos templates desativado: {e}")
+
+# Troca separadores en-US -> pt-BR em uma única passada: 1,234.56 -> 1.234,56
+_BR_SEPARATOR_SWAP = str.maketrans({',': '.', '.': ','})
+
+# Tipos numéricos vindos do banco (numeric chega como Decimal): formatados sem conversão
+_NUMERIC_TYPES = (int, float, Decimal)
+
+@functools.lru_cache(maxsize=4096)
+def _format_number_br(value) -> str:
+    """1.234,56 — núcleo comum da tela (currency_br) e da exportação CSV, mesmo arredondamento.
+    Memoizado: os mesmos valores/acumulados se repetem em muitas linhas"""
+    if not isinstance(value, _NUMERIC_TYPES):
+        value = float(value)
+    return f"{value:,.2f}".translate(_BR_SEPARATOR_SWAP)
+
+@functools.lru_cache(maxsize=4096)
+def _format_currency_br(value) -> str:
+    if isinstance(value, _NUMERIC_TYPES):
+        return f"R$ {_format_number_br(value)}"
+    if value is None or value == '':
+        return 'R$ 0,00'
+    # Converter para float se for string
+    if isinstance(value, str):
+        value = float(value.replace(',', '.'))
+    return f"R$ {_format_number_br(value)}"
+
 # Filtro customizado para formatação monetária brasileira
 @app.template_filter('currency_br')
 def currency_br_filter(value):
     """Formata número para moeda brasileira: R$ 1.234.567,89"""
     try:
-        if value is None or value == '':
-            return 'R$ 0,00'
-        # Converter para float se for string
-        if isinstance(value, str):
-            value = float(value.replace(',', '.'))
-        # Formatar com separadores brasileiros
-        formatted = f"{float(value):,.2f}"
-        # Trocar separadores: 1,234.56 -> 1.234,56
-        formatted = formatted.replace(',', 'TEMP').replace('.', ',').replace('TEMP', '.')
-        return f"R$ {formatted}"
+        # Memoizado: muitos precatórios compartilham os mesmos valores
+        return _format_currency_br(value)
     except (ValueError, TypeError):
         return 'R$ 0,00'
 
@@ -75,281 +113,1039 @@ DB_CONFIG = {
 
 TABLE_NAME = 'precatorios'
 
+# Maior página aceita pela listagem (o padrão da tela é 200)
+LIST_MAX_PER_PAGE = 1000
+
+# Acima deste per_page a listagem usa cursor server-side em lotes de SERVER_SIDE_CURSOR_ITERSIZE
+SERVER_SIDE_CURSOR_THRESHOLD = 200
+SERVER_SIDE_CURSOR_ITERSIZE = 200
+
+# Exportação CSV: lida e enviada em lotes (resposta em streaming), até CSV_EXPORT_MAX_ROWS linhas
+CSV_EXPORT_BATCH_SIZE = 2000
+CSV_EXPORT_MAX_ROWS = 50000
+
+# Registros com esta_na_ordem=TRUE na listagem padrão: reltuples do índice parcial
+# (uma entrada por registro na ordem); o valor fixo só vale se o índice nunca foi analisado
+IN_ORDEM_INDEX_NAME = 'idx_precatorios_esta_na_ordem'
+TOTAL_RECORDS_IN_ORDEM = 84405
+
+# Campos com opções carregáveis via /api/get_filter_options
+FILTER_OPTIONS_FIELDS = frozenset({
+    'organizacao', 'prioridade', 'tribunal', 'natureza', 'situacao', 'regime', 'ano_orc'
+})
+
+# Limites da busca de IDs para seleção em massa (/api/get_all_ids)
+MAX_IDS_SELECTION = 5000
+IDS_STATEMENT_TIMEOUT_MS = 5000
+# Filtros aceitos pela busca de IDs
+ID_SEARCH_FILTER_FIELDS = frozenset({
+    'esta_na_ordem', 'valor', 'organizacao', 'prioridade', 'tribunal',
+    'natureza', 'situacao', 'regime', 'ano_orc', 'precatorio'
+})
+
+def escape_like(value: str) -> str:
+    """Escapa curingas de LIKE/ILIKE (\\, % e _) para busca literal com ESCAPE '\\'"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# Valores aceitos como verdadeiro/falso em filtros e campos booleanos (comparar com .upper())
+_TRUE_SET = frozenset({'TRUE', '1', 'SIM', 'S', 'YES', 'Y', 'VERDADEIRO'})
+_FALSE_SET = frozenset({'FALSE', '0', 'NÃO', 'NAO', 'N', 'NO', 'FALSO'})
+
+def _to_bool(value: Any) -> Optional[bool]:
+    """Booleano de filtro/campo: bool passa direto; o resto é classificado pelo texto
+    (SIM/NÃO, TRUE/FALSE, 1/0...). None se não reconhecido (inclusive None)"""
+    if isinstance(value, bool):
+        return value
+    normalized = str(value).strip().upper()
+    if normalized in _TRUE_SET:
+        return True
+    if normalized in _FALSE_SET:
+        return False
+    return None
+
+# ===== Construção de filtros da listagem de precatórios =====
+# Cada handler recebe (campo, valor) e retorna (fragmento SQL, parâmetros) ou None para ignorar
+class _KeepCharsTable(dict):
+    """Tabela para str.translate que mantém apenas os caracteres em `keep` (memoiza por code point)"""
+
+    def __init__(self, keep: str, replace: Optional[Dict[str, str]] = None):
+        super().__init__({ord(k): v for k, v in (replace or {}).items()})
+        self._keep = frozenset(keep)
+
+    def __missing__(self, codepoint: int):
+        result = codepoint if chr(codepoint) in self._keep else None
+        self[codepoint] = result
+        return result
+
+# Substituem re.sub(r"[^0-9.]", ...) / re.sub(r"[^0-9]", ...) por uma consulta de tabela por caractere
+_KEEP_DIGITS_DOT = _KeepCharsTable('0123456789.')
+_KEEP_DIGITS = _KeepCharsTable('0123456789')
+# Valor já normalizado (só dígitos e, opcionalmente, um ponto decimal)
+_PLAIN_DECIMAL_RE = re.compile(r"[0-9]+(?:\.[0-9]+)?")
+# Remove R, $, espaços e demais símbolos e troca vírgula decimal por ponto em uma única passada
+_CURRENCY_CLEAN_TRANSLATE = _KeepCharsTable('0123456789.', {',': '.'})
+# Formato brasileiro (1.234,56): descarta os pontos de milhar e troca a vírgula decimal por ponto
+_BRL_DECIMAL_COMMA_TRANSLATE = _KeepCharsTable('0123456789', {',': '.'})
+
+def _parse_filter_amount(value: str) -> Optional[Decimal]:
+    """Converte o valor digitado no filtro de faixa para Decimal (None se vazio).
+
+    valor é numeric(14,2) (migrations/2025-10-23_standardize_column_types.sql): o parâmetro
+    vai como numeric exato, sem arredondamento binário de float na comparação com a coluna.
+    """
+    normalized_val = value.translate(_CURRENCY_CLEAN_TRANSLATE)
+    return Decimal(normalized_val) if normalized_val else None
+
+def _normalize_currency_str(s: str) -> Optional[float]:
+    """Valor monetário da query string (filtro_valor_min/max) para float, None se vazio/inválido"""
+    if not s or not s.strip():
+        return None
+    try:
+        # Uma única passada: remove R$, espaços e demais símbolos. Se tem vírgula, ela é o
+        # separador decimal brasileiro (vira ponto) e os pontos são separadores de milhar
+        s = s.translate(_BRL_DECIMAL_COMMA_TRANSLATE if ',' in s else _KEEP_DIGITS_DOT)
+        
+        return float(s) if s else None
+    except Exception as e:
+        logger.warning(f"Erro ao normalizar valor: {s} - {e}")
+        return None
+
+def _build_in_clause(field: str, value: Any, coerce: Optional[Callable[[Any], Any]] = None,
+                     split: bool = True) -> Optional[Tuple[str, List[Any]]]:
+    """`campo = %s` (um valor) ou `campo IN (...)` (vários) a partir de lista ou, com `split`,
+    de string separada por vírgulas; None se não sobrar valor. `coerce` pode levantar ValueError"""
+    if isinstance(value, list):
+        values = [v for v in value if v]
+    elif split and isinstance(value, str) and ',' in value:
+        values = [v.strip() for v in value.split(',') if v.strip()]
+    else:
+        values = [value]
+    if coerce is not None:
+        values = [coerce(v) for v in values]
+    if not values:
+        return None
+    if len(values) == 1:
+        return (f"{field} = %s", values)
+    return (f"{field} IN ({','.join(['%s'] * len(values))})", values)
+
+def _filter_valor_min(field: str, value: Any):
+    try:
+        valor_min_float = _parse_filter_amount(value)
+    except (InvalidOperation, ValueError, TypeError, AttributeError):
+        logger.warning(f"Valor mínimo inválido: {value}")
+        return None
+    return ("valor >= %s", [valor_min_float]) if valor_min_float is not None else None
+
+def _filter_valor_max(field: str, value: Any):
+    try:
+        valor_max_float = _parse_filter_amount(value)
+    except (InvalidOperation, ValueError, TypeError, AttributeError):
+        logger.warning(f"Valor máximo inválido: {value}")
+        return None
+    return ("valor <= %s", [valor_max_float]) if valor_max_float is not None else None
+
+def _filter_boolean(field: str, value: Any):
+    # Converter string 'SIM'/'NAO' para boolean PostgreSQL (não reconhecido = FALSE)
+    return (f"{field} = %s", [bool(_to_bool(value))])
+
+def _filter_ordem(field: str, value: Any):
+    # Se o valor contém apenas dígitos, tratar como integer; senão, busca parcial como texto
+    try:
+        digits_only = str(value).translate(_KEEP_DIGITS)
+        if digits_only and digits_only == str(value).strip():
+            return (f"{field} = %s", [int(digits_only)])
+        return (f"CAST({field} AS TEXT) ILIKE %s ESCAPE '\\'", [f"%{escape_like(str(value))}%"])
+    except (ValueError, TypeError):
+        logger.warning(f"Valor inválido para filtro de {field}: {value}")
+        return None
+
+def _filter_integer_choice(field: str, value: Any):
+    # Inteiro (ano_orc): lista (múltipla seleção) vira IN, valor único vira =
+    try:
+        return _build_in_clause(field, value, coerce=int, split=False)
+    except (ValueError, TypeError):
+        logger.warning(f"Valor inválido para filtro de {field}: {value}")
+        return None
+
+def _filter_choice(field: str, value: Any):
+    # Campos dropdown texto: lista (múltipla seleção) vira IN, valor único vira =
+    # (sem separar vírgulas: nomes de organização podem contê-las)
+    return _build_in_clause(field, value, split=False)
+
+def _filter_text_contains(field: str, value: Any):
+    # Outros campos texto (como precatorio): busca parcial
+    return (f"{field} ILIKE %s ESCAPE '\\'", [f"%{escape_like(value)}%"])
+
+# Colunas retornadas pela listagem (ordenadas conforme especificação)
+PRECATORIO_LIST_FIELDS = (
+    'id', 'precatorio', 'ordem', 'organizacao', 'prioridade', 'tribunal',
+    'natureza', 'data_base', 'situacao', 'esta_na_ordem',
+    'nao_esta_na_ordem', 'ano_orc', 'valor', 'presenca_no_pipe', 'regime'
+)
+# Campos exibidos na tabela da página principal (ordenados conforme especificação);
+# estáticos, montados uma vez na importação
+DISPLAY_FIELDS = (
+    {'name': 'id', 'label': 'ID', 'type': 'integer', 'editable': False, 'visible': False},
+    {'name': 'precatorio', 'label': 'Precatório', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'ordem', 'label': 'Ordem', 'type': 'integer', 'editable': False, 'visible': True},
+    {'name': 'organizacao', 'label': 'Organização', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'prioridade', 'label': 'Prioridade', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'tribunal', 'label': 'Tribunal', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'natureza', 'label': 'Natureza', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'regime', 'label': 'Regime', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'ano_orc', 'label': 'Ano Orçamentário', 'type': 'integer', 'editable': False, 'visible': True},
+    {'name': 'situacao', 'label': 'Situação', 'type': 'character varying', 'editable': True, 'visible': True},
+    {'name': 'valor', 'label': 'Valor', 'type': 'numeric', 'editable': True, 'visible': True},
+    {'name': 'esta_na_ordem', 'label': 'Está na Ordem', 'type': 'boolean', 'editable': False, 'visible': True},
+    {'name': 'acumulativo_pec66', 'label': 'Valor Acumulado', 'type': 'numeric', 'editable': False, 'visible': True},
+    {'name': 'pec66_resultado_arredondado', 'label': 'Meses', 'type': 'numeric', 'editable': False, 'visible': True},
+    {'name': 'caprec', 'label': 'CAPREC', 'type': 'character varying', 'editable': False, 'visible': True},
+    {'name': 'presenca_no_pipe', 'label': 'No Pipe', 'type': 'boolean', 'editable': False, 'visible': True},
+)
+
+# Colunas da exportação CSV (campos visíveis)
+EXPORT_FIELDS = (
+    {'name': 'precatorio', 'label': 'Precatório'},
+    {'name': 'ordem', 'label': 'Ordem'},
+    {'name': 'organizacao', 'label': 'Organização'},
+    {'name': 'prioridade', 'label': 'Prioridade'},
+    {'name': 'tribunal', 'label': 'Tribunal'},
+    {'name': 'natureza', 'label': 'Natureza'},
+    {'name': 'regime', 'label': 'Regime'},
+    {'name': 'ano_orc', 'label': 'Ano Orçamentário'},
+    {'name': 'situacao', 'label': 'Situação'},
+    {'name': 'valor', 'label': 'Valor'},
+    {'name': 'acumulativo_pec66', 'label': 'Valor Acumulado'},
+    {'name': 'pec66_resultado_arredondado', 'label': 'Meses'},
+    {'name': 'caprec', 'label': 'CAPREC'},
+    {'name': 'presenca_no_pipe', 'label': 'No Pipe'},
+)
+
+def _format_export_money(value) -> str:
+    """Número brasileiro sem símbolo (1.234,56); valor inválido sai como está"""
+    try:
+        if isinstance(value, str):
+            value = float(value.replace(',', '.'))
+        return _format_number_br(value)
+    except (ValueError, TypeError):
+        return str(value)
+
+# Exportação direta (?raw=1): COPY ... TO STDOUT entrega o CSV pronto do servidor, sem montar
+# objetos Python por linha. Mesmas colunas e formatos da exportação completa, exceto as
+# calculadas em Python (PEC 66 / CAPREC)
+EXPORT_COPY_COMPUTED_FIELDS = frozenset({'acumulativo_pec66', 'pec66_resultado_arredondado', 'caprec'})
+EXPORT_COPY_SQL_EXPRESSIONS = {
+    # 1234567.8 -> 1.234.567,80 (translate troca os separadores em uma passada)
+    'valor': "translate(to_char(valor, 'FM999,999,999,990.00'), ',.', '.,')",
+    'presenca_no_pipe': "CASE WHEN presenca_no_pipe THEN 'Sim' WHEN NOT presenca_no_pipe THEN 'Não' END",
+}
+EXPORT_COPY_SELECT = ', '.join(
+    f'{EXPORT_COPY_SQL_EXPRESSIONS.get(field["name"], field["name"])} AS "{field["label"]}"'
+    for field in EXPORT_FIELDS if field['name'] not in EXPORT_COPY_COMPUTED_FIELDS
+)
+
+# Formatador por coluna, resolvido uma vez (em vez de comparar o nome do campo a cada célula)
+_EXPORT_FORMATTERS = {
+    'valor': _format_export_money,
+    'acumulativo_pec66': _format_export_money,
+    'presenca_no_pipe': lambda value: 'Sim' if value else 'Não',
+    'pec66_resultado_arredondado': lambda value: str(int(value)),
+}
+_EXPORT_COLUMNS = tuple((field['name'], _EXPORT_FORMATTERS.get(field['name'], str)) for field in EXPORT_FIELDS)
+
+def format_export_row(record: Dict[str, Any]) -> List[str]:
+    """Linha do CSV de exportação (valores formatados no padrão brasileiro)"""
+    row = []
+    for name, formatter in _EXPORT_COLUMNS:
+        value = record.get(name)
+        row.append('' if value is None else formatter(value))
+    return row
+
+# Ordenação permitida apenas em colunas seguras/indexadas
+SAFE_SORT_FIELDS = frozenset({'ordem', 'ano_orc', 'valor'})
+
+@functools.lru_cache(maxsize=256)
+def build_precatorios_list_query(where_conditions: Tuple[str, ...], sort_field: str, sort_order: str,
+                                 keyset: Optional[str] = None) -> str:
+    """Monta o SELECT paginado da listagem (LIMIT/OFFSET como parâmetros).
+
+    Cacheado pelo formato da consulta: as condições carregam apenas placeholders,
+    então há poucas combinações distintas e nenhum valor do usuário na chave.
+    Com `keyset` a página segue o último registro da anterior, sem OFFSET (ver KEYSET_SEGMENTS):
+    'after' -> (campo, id) após (%s, %s); 'null_after' -> campo NULL e id após %s;
+    'nulls' -> todos com campo NULL; 'not_null' -> todos com campo preenchido.
+    """
+    query = f"SELECT {', '.join(PRECATORIO_LIST_FIELDS)} FROM {TABLE_NAME}"
+    op = '>' if sort_order == 'ASC' else '<'
+    if keyset == 'after':
+        where_conditions += (f"({sort_field}, id) {op} (%s, %s)",)
+    elif keyset == 'null_after':
+        where_conditions += (f"{sort_field} IS NULL", f"id {op} %s")
+    elif keyset == 'nulls':
+        where_conditions += (f"{sort_field} IS NULL",)
+    elif keyset == 'not_null':
+        where_conditions += (f"{sort_field} IS NOT NULL",)
+    if where_conditions:
+        query += " WHERE " + " AND ".join(where_conditions)
+    # Se ordenando por ordem e há filtro esta_na_ordem, o índice composto será usado;
+    # id desempata a ordenação para que OFFSET e paginação por chave vejam a mesma sequência
+    query += f" ORDER BY {sort_field} {sort_order}, id {sort_order} LIMIT %s" + ("" if keyset else " OFFSET %s")
+    return query
+
+# Paginação por chave: trechos consultados em sequência até completar a página, conforme
+# (ordenação, último valor NULL?). NULLs vêm depois dos valores em ASC e antes em DESC
+# (padrão do PostgreSQL); cada trecho é uma busca por índice, sem OR que impeça o seek
+KEYSET_SEGMENTS = {
+    ('ASC', False): ('after', 'nulls'),
+    ('ASC', True): ('null_after',),
+    ('DESC', False): ('after',),
+    ('DESC', True): ('null_after', 'not_null'),
+}
+
+def build_precatorios_list_conditions(filters: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any], List[str]]:
+    """Condições WHERE (e parâmetros) da listagem a partir dos filtros; devolve também os
+    filtros além do esta_na_ordem (processado à parte, padrão SIM)"""
+    where_conditions = []
+    params = []
+
+    # Processar filtro esta_na_ordem primeiro (filtro padrão se não especificado)
+    esta_na_ordem_filter = filters.get('esta_na_ordem', 'SIM').strip().upper() if filters else 'SIM'
+
+    # Filtros além do esta_na_ordem (processado à parte), calculados uma única vez; lista
+    # mantém a ordem da query string e, com ela, o formato estável do SQL cacheado
+    custom_keys = [key for key, value in filters.items() if value and key != 'esta_na_ordem'] if filters else []
+
+    # Validar valor do filtro esta_na_ordem
+    esta_na_ordem_bool = _to_bool(esta_na_ordem_filter)
+    if esta_na_ordem_bool is True:
+        where_conditions.append("esta_na_ordem = TRUE")
+    elif esta_na_ordem_bool is False:
+        where_conditions.append("esta_na_ordem = FALSE")
+    elif esta_na_ordem_filter == '' or esta_na_ordem_filter == 'TODOS' or esta_na_ordem_filter == 'ALL':
+        # Não adiciona filtro (mostrar todos)
+        pass
+    else:
+        # Valor inválido - aplicar filtro padrão
+        where_conditions.append("esta_na_ordem = TRUE")
+
+    for field in custom_keys:
+        # Despacho O(1) por campo; demais colunas da lista usam busca parcial (ILIKE)
+        handler = PRECATORIO_FILTER_HANDLERS.get(field)
+        if handler is None:
+            if field not in PRECATORIO_LIST_FIELDS:
+                continue
+            handler = _filter_text_contains
+        condition = handler(field, filters[field])
+        if condition is not None:
+            where_conditions.append(condition[0])
+            params.extend(condition[1])
+    return where_conditions, params, custom_keys
+
+# Tipo do valor de cada campo de ordenação dentro do cursor de paginação
+_CURSOR_SORT_TYPES = {'ordem': int, 'ano_orc': int, 'valor': Decimal}
+
+def encode_precatorios_cursor(row: Dict[str, Any], sort_field: str = 'ordem') -> str:
+    """Cursor opaco de paginação da listagem: '<valor do campo de ordenação>_<id>' (valor vazio = NULL)"""
+    value = row.get(sort_field)
+    return f"{'' if value is None else value}_{row['id']}"
+
+def decode_precatorios_cursor(value: str, sort_field: str = 'ordem') -> Optional[Tuple[Any, int]]:
+    """Inverso de encode_precatorios_cursor (None se inválido: cai no OFFSET por página)"""
+    try:
+        sort_value, _, precatorio_id = value.rpartition('_')
+        if not _:
+            return None
+        return (_CURSOR_SORT_TYPES[sort_field](sort_value) if sort_value else None), int(precatorio_id)
+    except (InvalidOperation, KeyError, ValueError, TypeError, AttributeError):
+        return None
+
+def skip_scan_cte(field: str) -> str:
+    """CTE recursiva `skip_<campo>(v)` com os valores distintos do campo entre os registros na
+    ordem: "loose index scan" sobre idx_precs_ord_<campo>_partial, um salto no índice por valor
+    distinto (O(D log N)) em vez de ler todos os registros. Usar com WITH RECURSIVE"""
+    return (
+        f"skip_{field}(v) AS ("
+        f"SELECT min({field}) FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE "
+        f"UNION ALL "
+        f"SELECT (SELECT min({field}) FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE AND {field} > s.v) "
+        f"FROM skip_{field} s WHERE s.v IS NOT NULL)"
+    )
+
+# work_mem das consultas de dropdown: o HashAggregate do GROUP BY cabe em memória sem spill
+# para disco. SET LOCAL no mesmo envio da consulta (bloco de transação implícito): vale só
+# para ela e não contamina as consultas seguintes da requisição na mesma conexão
+FILTER_VALUES_WORK_MEM_SETTING = "SET LOCAL work_mem TO '64MB'; "
+
+# Tipos SQL dos campos atualizáveis em massa (os demais são texto)
+BULK_UPDATE_FIELD_TYPES = {
+    'ordem': 'integer',
+    'ano_orc': 'integer',
+    'valor': 'numeric',
+    'esta_na_ordem': 'boolean',
+    'nao_esta_na_ordem': 'boolean',
+    'presenca_no_pipe': 'boolean',
+    'data_base': 'date',
+}
+BULK_UPDATE_PAGE_SIZE = 500
+# Colunas que a edição em massa pode alterar (o nome é interpolado no SQL)
+BULK_UPDATABLE_FIELDS = frozenset(PRECATORIO_LIST_FIELDS) - {'id'}
+
+def bulk_update_value(field: str, value: Any) -> Any:
+    """Converte o valor da edição em massa para o tipo Python do campo (None = manter o atual)"""
+    if value is None:
+        return None
+    if field in ('ordem', 'ano_orc'):
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            return None
+    if field == 'valor':
+        try:
+            if isinstance(value, str):
+                normalized_val = value.translate(_CURRENCY_CLEAN_TRANSLATE)
+                return float(normalized_val) if normalized_val else None
+            return float(value)
+        except (ValueError, TypeError):
+            return None
+    if field in ('esta_na_ordem', 'nao_esta_na_ordem', 'presenca_no_pipe'):
+        return bool(_to_bool(value))
+    if field == 'data_base':
+        return value.date() if isinstance(value, datetime) else value
+    return str(value)
+
+LOG_INSERT_PAGE_SIZE = 1000
+# Colunas do precatório copiadas para cada linha de log (além do id)
+LOG_CONTEXT_FIELDS = ('id', 'organizacao', 'prioridade', 'tribunal', 'precatorio', 'ordem')
+# Colunas de precatorios_logs com dropdown de filtro na tela de logs
+LOG_FILTER_FIELDS = ('organizacao', 'prioridade', 'tribunal', 'campo_modificado', 'precatorio')
+# A partir deste número de linhas de log, COPY FROM STDIN compensa o custo fixo frente ao INSERT
+LOG_COPY_THRESHOLD = 100
+LOG_COLUMNS_SQL = ("organizacao, prioridade, tribunal, campo_modificado, valor_anterior, valor_novo, "
+                   "data_modificacao, precatorio, ordem")
+LOG_COPY_NULL = '\\N'
+
+def build_log_row(field: str, old_value: Any, new_value: Any, modified_at: datetime,
+                  organizacao: str, prioridade: str, tribunal: str, precatorio: str, ordem: int) -> tuple:
+    """Linha de precatorios_logs na ordem das colunas do INSERT de log_precatorio_changes"""
+    return (
+        organizacao,
+        prioridade,
+        tribunal,
+        field,
+        str(old_value) if old_value is not None else None,
+        str(new_value) if new_value is not None else None,
+        modified_at,
+        precatorio,
+        ordem
+    )
+
+# Tela inicial (esta_na_ordem = TRUE, ordem ASC): SQL fixo montado na importação
+DEFAULT_LIST_QUERY = build_precatorios_list_query(("esta_na_ordem = TRUE",), 'ordem', 'ASC')
+
+PRECATORIO_FILTER_HANDLERS = {
+    'valor_min': _filter_valor_min,
+    'valor_max': _filter_valor_max,
+    'nao_esta_na_ordem': _filter_boolean,
+    'presenca_no_pipe': _filter_boolean,
+    'ordem': _filter_ordem,
+    'ano_orc': _filter_integer_choice,
+    'organizacao': _filter_choice,
+    'prioridade': _filter_choice,
+    'tribunal': _filter_choice,
+    'natureza': _filter_choice,
+    'situacao': _filter_choice,
+    'regime': _filter_choice,
+}
+
 # Função para obter horário brasileiro
 def get_brazil_time():
     """Retorna o horário atual do Brasil (UTC-3)"""
     brazil_tz = timezone(timedelta(hours=-3))
     return datetime.now(brazil_tz)
 
-import copy
+# Valores pré-agregados dos dropdowns (sem filtros ativos): uma linha por (campo, valor),
+# com a contagem e a posição na ordenação nativa do campo
+FILTER_VALUES_MV = 'mv_filter_values_precatorios'
+FILTER_VALUES_MV_FIELDS = ('prioridade', 'tribunal', 'natureza', 'regime', 'situacao', 'ano_orc', 'organizacao')
+FILTER_VALUES_MV_SQL = (
+    f"CREATE MATERIALIZED VIEW IF NOT EXISTS {FILTER_VALUES_MV} AS "
+    + " UNION ALL ".join(
+        f"SELECT '{field}'::text AS field, {field}::text AS value, count(*) AS total, "
+        f"row_number() OVER (ORDER BY {field}) AS pos "
+        f"FROM precatorios WHERE esta_na_ordem = TRUE AND {field} IS NOT NULL GROUP BY {field}"
+        for field in FILTER_VALUES_MV_FIELDS
+    )
+    + f";\nCREATE UNIQUE INDEX IF NOT EXISTS idx_mv_filter_values_field_value ON {FILTER_VALUES_MV}(field, value)"
+    # Com o índice único, o REFRESH não bloqueia leituras da view
+    + f";\nREFRESH MATERIALIZED VIEW CONCURRENTLY {FILTER_VALUES_MV}"
+)
+
+# Índices recomendados, aplicados via /admin/apply_indexes (um por requisição com ?which=<nome>)
+# CONCURRENTLY evita bloquear escritas em precatorios durante a construção
+OPTIMIZATION_INDEXES = {
+    # Lista principal (filtro + ordenação)
+    'esta_ordem_ordem': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_esta_ordem_ordem ON precatorios(esta_na_ordem, ordem)",
+    # Filtro por valor com filtro padrão
+    'esta_ordem_valor': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_esta_ordem_valor ON precatorios(esta_na_ordem, valor)",
+    # Dropdowns
+    'esta_ordem_prioridade': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_esta_ordem_prioridade ON precatorios(esta_na_ordem, prioridade)",
+    'esta_ordem_regime': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_esta_ordem_regime ON precatorios(esta_na_ordem, regime)",
+    'esta_ordem_tribunal': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_esta_ordem_tribunal ON precatorios(esta_na_ordem, tribunal)",
+    'esta_ordem_natureza': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_esta_ordem_natureza ON precatorios(esta_na_ordem, natureza)",
+    # Filtros isolados por valor e ano orçamentário
+    'valor': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_valor ON precatorios(valor) WHERE valor IS NOT NULL",
+    'ano_orc': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_ano_orc ON precatorios(ano_orc) WHERE ano_orc IS NOT NULL",
+    # Combinação mais comum de filtros na seleção em massa; INCLUDE (id) permite index-only scan
+    # para o SELECT id de /api/get_all_ids
+    'hot_filters': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_hot "
+        "ON precatorios(organizacao, tribunal, ano_orc, valor) INCLUDE (id) WHERE esta_na_ordem = TRUE"
+    ),
+    # Dropdowns (get_filter_values): índices parciais sobre esta_na_ordem = TRUE
+    'organizacao_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_organizacao_partial ON precatorios(organizacao) WHERE esta_na_ordem = TRUE",
+    'prioridade_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_prioridade_partial ON precatorios(prioridade) WHERE esta_na_ordem = TRUE",
+    'tribunal_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_tribunal_partial ON precatorios(tribunal) WHERE esta_na_ordem = TRUE",
+    'natureza_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_natureza_partial ON precatorios(natureza) WHERE esta_na_ordem = TRUE",
+    'regime_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_regime_partial ON precatorios(regime) WHERE esta_na_ordem = TRUE",
+    'situacao_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_situacao_partial ON precatorios(situacao) WHERE esta_na_ordem = TRUE",
+    'ano_orc_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_ano_orc_partial ON precatorios(ano_orc) WHERE esta_na_ordem = TRUE",
+    # /api/get_all_ids com o filtro padrão: SELECT id ... ORDER BY id LIMIT n em index-only scan
+    'id_ordem_partial': "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_ordem_true_id ON precatorios(id) WHERE esta_na_ordem = TRUE",
+    # Listagem por ordem: ORDER BY ordem, id e paginação por chave (ordem, id) > (%s, %s)
+    'ordem_id_ordem_partial': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_ordem_id "
+        "ON precatorios(ordem, id) WHERE esta_na_ordem = TRUE"
+    ),
+    # Paginação por chave ordenando por valor / ano orçamentário: (campo, id) > (%s, %s)
+    'valor_id_ordem_partial': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_valor_id "
+        "ON precatorios(valor, id) WHERE esta_na_ordem = TRUE"
+    ),
+    'ano_orc_id_ordem_partial': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_ano_orc_id "
+        "ON precatorios(ano_orc, id) WHERE esta_na_ordem = TRUE"
+    ),
+    # get_max_value (ORDER BY valor DESC NULLS LAST LIMIT 1): leitura de uma única entrada do índice
+    'valor_desc_ordem_partial': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_valor_desc "
+        "ON precatorios(valor DESC NULLS LAST) WHERE esta_na_ordem = TRUE AND valor IS NOT NULL"
+    ),
+    # Logs (get_logs_paginated): ORDER BY data_modificacao DESC LIMIT n para cedo no índice
+    # (data_modificacao, id) atende também a paginação por chave (l.data_modificacao, l.id) < (%s, %s)
+    'logs_data_id_desc': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_logs_data_id_desc "
+        "ON precatorios_logs(data_modificacao DESC, id DESC)"
+    ),
+    'logs_organizacao_data': (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_logs_organizacao_data "
+        "ON precatorios_logs(organizacao, data_modificacao DESC)"
+    ),
+    # Dropdowns sem filtros ativos (cria na primeira vez, depois só atualiza);
+    # agendar diariamente: /admin/apply_indexes?which=filter_values_mv
+    'filter_values_mv': FILTER_VALUES_MV_SQL,
+    # Estatísticas mais frescas para o planner (sem precisar de enable_seqscan = off)
+    'autovacuum_analyze': "ALTER TABLE precatorios SET (autovacuum_analyze_scale_factor = 0.02)",
+    # Atualizar estatísticas
+    'analyze': "ANALYZE precatorios",
+}
+
+# Snapshots em disco para os endpoints de diagnóstico (evitam consultas ao vivo)
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/tmp')
+QUICK_STATS_SNAPSHOT = os.path.join(SNAPSHOT_DIR, 'precatorios_quick.json')
+QUICK_STATS_SNAPSHOT_TTL = 300  # 5 minutos
+STRUCTURE_SNAPSHOT = os.path.join(SNAPSHOT_DIR, 'precatorios_structure.json')
+STRUCTURE_SNAPSHOT_TTL = 86400  # 24 horas (estrutura raramente muda)
+
+# Estrutura da tabela em memória (evita reler o snapshot em disco a cada chamada)
+_table_structure_cache = None  # (time.monotonic(), estrutura)
+TABLE_STRUCTURE_TTL = 1800.0  # 30 minutos
+
+def read_snapshot(path: str, max_age: int) -> Optional[Any]:
+    """Retorna o conteúdo do snapshot se existir e tiver menos de max_age segundos"""
+    try:
+        if time.time() - os.path.getmtime(path) >= max_age:
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_snapshot(path: str, payload: Any) -> None:
+    """Persiste o snapshot de forma atômica (falhas apenas geram aviso)"""
+    try:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Não foi possível gravar snapshot {path}: {e}")
+
+def build_filter_values_conditions(field: Optional[str], active_filters: Optional[Dict[str, Any]]) -> Tuple[List[str], List[Any]]:
+    """Condições extras (e parâmetros) dos dropdowns a partir dos filtros ativos, ignorando o próprio campo"""
+    where_conditions = []
+    params = []
+    # Aplicar filtros ativos (exceto o próprio campo que estamos buscando)
+    if active_filters:
+        for filter_field, filter_value in active_filters.items():
+            # Não aplicar filtro no próprio campo
+            if filter_field != field and filter_value:
+                clause = None
+                # Campos de texto: igualdade exata ou IN para múltiplos valores (lista ou "a,b")
+                if filter_field in ['organizacao', 'precatorio', 'tribunal', 'natureza', 'situacao', 'regime', 'prioridade']:
+                    clause = _build_in_clause(filter_field, filter_value)
+                # Campos numéricos: igualdade exata ou IN
+                elif filter_field in ['ordem', 'ano_orc']:
+                    try:
+                        clause = _build_in_clause(filter_field, filter_value, coerce=int)
+                    except (ValueError, TypeError):
+                        pass
+                # Campos booleanos (SIM/NAO como no formulário, TRUE/FALSE...)
+                elif filter_field == 'esta_na_ordem':
+                    bool_value = _to_bool(filter_value)
+                    if bool_value is not None:
+                        clause = (f"{filter_field} = %s", [bool_value])
+                # Campo valor (já tratado separadamente)
+                elif filter_field == 'valor':
+                    try:
+                        # Decimal exato contra numeric(14,2), como o filtro da listagem
+                        valor_max = _parse_filter_amount(str(filter_value))
+                        if valor_max is not None:
+                            clause = (f"{filter_field} <= %s", [valor_max])
+                    except (InvalidOperation, ValueError, TypeError):
+                        pass
+                if clause is not None:
+                    where_conditions.append(clause[0])
+                    params.extend(clause[1])
+    return where_conditions, params
+
+# Pool de conexões do processo: um lambda "quente" do Vercel reaproveita as conexões
+# em vez de refazer o handshake TCP+TLS+auth a cada requisição
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX') or os.environ.get('PG_POOL_MAX', 4))
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+# Configurações otimizadas para Vercel (montadas uma vez, na importação)
+_CONN_PARAMS = {
+    **DB_CONFIG,
+    'connect_timeout': 10,  # Timeout reduzido para falhar mais rápido se houver problema
+    'application_name': 'precatorios_vercel',
+    'keepalives_idle': 300,  # Reduzido para detectar desconexões mais rápido
+    'keepalives_interval': 30,  # Intervalo razoável
+    'keepalives_count': 3,  # Menos tentativas para falhar mais rápido
+    # Timeouts otimizados para queries com paginação e índices (reduzido para primeira carga)
+    'options': '-c statement_timeout=20000 -c idle_in_transaction_session_timeout=20000 -c lock_timeout=3000',
+    'cursor_factory': RealDictCursor
+}
+
+def get_db_pool() -> ThreadedConnectionPool:
+    """Cria (preguiçosamente) e retorna o pool de conexões do processo"""
+    global _db_pool
+    if _db_pool is None or _db_pool.closed:
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool.closed:
+                conn_params = _CONN_PARAMS
+                # No Vercel, preferir o endpoint com pooler (PgBouncer) quando configurado
+                pooler_url = os.environ.get('PGBOUNCER_URL')
+                if pooler_url and os.environ.get('VERCEL') == '1':
+                    conn_params = {key: value for key, value in _CONN_PARAMS.items() if key not in DB_CONFIG}
+                    conn_params['dsn'] = pooler_url
+                    logger.info("Criando pool de conexões via PGBOUNCER_URL")
+                else:
+                    logger.info(f"Criando pool de conexões para {DB_CONFIG['host']}:{DB_CONFIG['port']}")
+                _db_pool = ThreadedConnectionPool(minconn=1, maxconn=DB_POOL_MAX, **conn_params)
+    return _db_pool
+
+# Dropdowns carregados em paralelo (PARALLEL_FILTER_VALUES=0 volta ao carregamento sequencial).
+# Executor único por processo: as threads sobrevivem entre requisições (e invocações do Vercel)
+PARALLEL_FILTER_VALUES = os.environ.get('PARALLEL_FILTER_VALUES', '1') == '1'
+_filter_values_executor = None
+_filter_values_executor_lock = threading.Lock()
+
+def get_filter_values_executor() -> ThreadPoolExecutor:
+    """Executor compartilhado para get_filter_values_batch (criado sob demanda)"""
+    global _filter_values_executor
+    if _filter_values_executor is None:
+        with _filter_values_executor_lock:
+            if _filter_values_executor is None:
+                # Uma conexão do pool fica reservada para a própria requisição
+                _filter_values_executor = ThreadPoolExecutor(
+                    max_workers=max(DB_POOL_MAX - 1, 1), thread_name_prefix='filter-values'
+                )
+    return _filter_values_executor
+
+# Statements preparados no servidor, por conexão do pool (PREPARE vale para a sessão inteira).
+# Desligado atrás do PgBouncer: em modo transação a sessão muda a cada comando.
+_prepared_statements = weakref.WeakKeyDictionary()
+_PLACEHOLDER_RE = re.compile(r"%s")
+# Limite por sessão: cada formato de filtro vira um statement (e um plano em memória no servidor);
+# formatos raros além do limite executam direto
+PREPARED_STATEMENTS_PER_CONNECTION = 64
+
+def prepared_statements_enabled() -> bool:
+    if os.environ.get('PG_PREPARED_STATEMENTS', '1') != '1':
+        return False
+    return not (os.environ.get('PGBOUNCER_URL') and os.environ.get('VERCEL') == '1')
+
+@functools.lru_cache(maxsize=256)
+def prepared_statement_for(query: str) -> Tuple[str, str, int]:
+    """Converte uma consulta com placeholders %s em (nome, comando PREPARE, nº de parâmetros)"""
+    name = "precs_" + hashlib.md5(query.encode('utf-8')).hexdigest()[:16]
+    counter = iter(range(1, query.count('%s') + 1))
+    body = _PLACEHOLDER_RE.sub(lambda _: f"${next(counter)}", query)
+    return name, f"PREPARE {name} AS {body}", query.count('%s')
 
 class DatabaseManager:
-    """Gerenciador de conexão com banco de dados otimizado para Vercel"""
+    """Gerenciador de conexão com banco de dados otimizado para Vercel.
+
+    Conexão e cursor são por thread: a instância global `db_manager` atende requisições
+    simultâneas (servidor com threads), cada uma com sua própria conexão do pool.
+    """
     
     def __init__(self):
-        self.connection = None
-        self.cursor = None
+        self._local = threading.local()
+
+    def __enter__(self) -> 'DatabaseManager':
+        """`with DatabaseManager() as db:` pega uma conexão do pool e a devolve na saída"""
+        if not self.connect():
+            raise psycopg2.OperationalError("Não foi possível obter conexão do pool")
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb) -> bool:
+        self.disconnect()
+        return False
+
+    @property
+    def connection(self):
+        return getattr(self._local, 'connection', None)
+
+    @connection.setter
+    def connection(self, value):
+        self._local.connection = value
+
+    @property
+    def cursor(self):
+        return getattr(self._local, 'cursor', None)
+
+    @cursor.setter
+    def cursor(self, value):
+        self._local.cursor = value
     
     def connect(self) -> bool:
-        """Conecta ao banco de dados com timeout otimizado"""
+        """Obtém uma conexão do pool do processo (reaproveitada entre invocações do Vercel)"""
+        # Já há uma conexão em uso por este gerenciador: reaproveitar
+        if self.connection and not self.connection.closed:
+            if not self.cursor or self.cursor.closed:
+                self.cursor = self.connection.cursor()
+            return True
+
         try:
-            # Configurações otimizadas para Vercel
-            conn_params = DB_CONFIG.copy()
-            conn_params.update({
-                'connect_timeout': 10,  # Timeout reduzido para falhar mais rápido se houver problema
-                'application_name': 'precatorios_vercel',
-                'keepalives_idle': 300,  # Reduzido para detectar desconexões mais rápido
-                'keepalives_interval': 30,  # Intervalo razoável
-                'keepalives_count': 3,  # Menos tentativas para falhar mais rápido
-                # Timeouts otimizados para queries com paginação e índices (reduzido para primeira carga)
-                'options': '-c statement_timeout=20000 -c idle_in_transaction_session_timeout=20000 -c lock_timeout=3000'
-            })
-            
-            logger.info(f"Tentando conectar ao banco: {conn_params['host']}:{conn_params['port']}")
-            self.connection = psycopg2.connect(**conn_params, cursor_factory=RealDictCursor)
-            self.cursor = self.connection.cursor()
+            pool = get_db_pool()
+            connection = pool.getconn()
+            if connection.closed:
+                # Conexão derrubada enquanto ociosa no pool: descartar e pegar outra
+                pool.putconn(connection, close=True)
+                connection = pool.getconn()
+            self.connection = connection
             # Evitar manter transações abertas e facilitar rollback automático após erros
             try:
                 self.connection.autocommit = True
             except Exception:
                 pass
-            logger.info("Conexão com banco estabelecida")
+            self.cursor = self.connection.cursor()
+            logger.info("Conexão com banco obtida do pool")
             return True
         except psycopg2.OperationalError as e:
             logger.error(f"Erro operacional na conexão: {e}")
-            logger.error(f"Configuração usada: host={conn_params.get('host')}, port={conn_params.get('port')}, user={conn_params.get('user')}, database={conn_params.get('database')}")
+            logger.error(f"Configuração usada: host={DB_CONFIG.get('host')}, port={DB_CONFIG.get('port')}, user={DB_CONFIG.get('user')}, database={DB_CONFIG.get('database')}")
             return False
         except psycopg2.Error as e:
+            # Inclui psycopg2.pool.PoolError (pool esgotado)
             logger.error(f"Erro PostgreSQL: {e}")
-            logger.error(f"Configuração usada: host={conn_params.get('host')}, port={conn_params.get('port')}, user={conn_params.get('user')}, database={conn_params.get('database')}")
+            logger.error(f"Configuração usada: host={DB_CONFIG.get('host')}, port={DB_CONFIG.get('port')}, user={DB_CONFIG.get('user')}, database={DB_CONFIG.get('database')}")
             return False
         except Exception as e:
             logger.error(f"Erro inesperado na conexão: {e}")
-            logger.error(f"Configuração usada: host={conn_params.get('host')}, port={conn_params.get('port')}, user={conn_params.get('user')}, database={conn_params.get('database')}")
+            logger.error(f"Configuração usada: host={DB_CONFIG.get('host')}, port={DB_CONFIG.get('port')}, user={DB_CONFIG.get('user')}, database={DB_CONFIG.get('database')}")
             return False
 
-    def apply_optimization_indexes(self) -> Dict[str, Any]:
-        """Cria índices recomendados e executa ANALYZE (idempotente)."""
+    def apply_optimization_indexes(self, which: Optional[str] = None) -> Dict[str, Any]:
+        """Cria índices recomendados (CONCURRENTLY) e executa ANALYZE (idempotente).
+
+        `which` permite aplicar um único item de OPTIMIZATION_INDEXES por requisição,
+        para que cada construção de índice caiba no tempo limite do Vercel.
+        """
         try:
+            if which is not None and which not in OPTIMIZATION_INDEXES:
+                return {'success': False, 'message': f'Índice desconhecido: {which}',
+                        'available': list(OPTIMIZATION_INDEXES.keys())}
+
             if not self.connection or self.connection.closed:
                 if not self.connect():
                     return {'success': False, 'message': 'Falha ao conectar'}
 
-            statements = [
-                # Lista principal (filtro + ordenação)
-                "CREATE INDEX IF NOT EXISTS idx_precatorios_esta_ordem_ordem  ON precatorios(esta_na_ordem, ordem)",
-                # Filtro por valor com filtro padrão
-                "CREATE INDEX IF NOT EXISTS idx_precatorios_esta_ordem_valor  ON precatorios(esta_na_ordem, valor)",
-                # Dropdowns
-                "CREATE INDEX IF NOT EXISTS idx_precatorios_esta_ordem_prioridade ON precatorios(esta_na_ordem, prioridade)",
-                "CREATE INDEX IF NOT EXISTS idx_precatorios_esta_ordem_regime     ON precatorios(esta_na_ordem, regime)",
-                "CREATE INDEX IF NOT EXISTS idx_precatorios_esta_ordem_tribunal   ON precatorios(esta_na_ordem, tribunal)",
-                "CREATE INDEX IF NOT EXISTS idx_precatorios_esta_ordem_natureza   ON precatorios(esta_na_ordem, natureza)",
-                # Atualizar estatísticas
-                "ANALYZE precatorios"
-            ]
-
-            created = []
-            for sql in statements:
-                try:
-                    self.cursor.execute(sql)
-                    created.append(sql.split(' IF NOT EXISTS ')[-1].split(' ON ')[0] if 'CREATE INDEX' in sql else sql)
-                except psycopg2.Error as e:
-                    logger.warning(f"Falha ao executar: {sql} -> {e}")
-                    # Continuar mesmo com falhas pontuais
+            # CREATE INDEX CONCURRENTLY não pode rodar dentro de transação
+            self.connection.autocommit = True
+            # Construção de índice pode passar do statement_timeout padrão da sessão (CONCURRENTLY
+            # exige autocommit, então não dá para usar SET LOCAL: restaurado no finally)
+            self.cursor.execute("SET statement_timeout TO 0")
+            try:
+                names = [which] if which is not None else list(OPTIMIZATION_INDEXES.keys())
+                # CONCURRENTLY não pode ir em lote (um envio com vários comandos vira um bloco de
+                # transação implícito); os demais comandos de manutenção vão juntos em uma ida ao banco
+                batches = [[name] for name in names if 'CONCURRENTLY' in OPTIMIZATION_INDEXES[name]]
+                maintenance = [name for name in names if 'CONCURRENTLY' not in OPTIMIZATION_INDEXES[name]]
+                if maintenance:
+                    batches.append(maintenance)
+
+                created = []
+                failed = []
+                for batch in batches:
+                    sql = ";\n".join(OPTIMIZATION_INDEXES[name] for name in batch)
                     try:
-                        self.connection.rollback()
-                    except Exception:
-                        pass
-            return {'success': True, 'created': created}
+                        self.cursor.execute(sql)
+                        created.extend(batch)
+                    except psycopg2.Error as e:
+                        logger.warning(f"Falha ao executar: {sql} -> {e}")
+                        failed.extend(batch)
+                        # Continuar mesmo com falhas pontuais
+                        try:
+                            self.connection.rollback()
+                        except Exception:
+                            pass
+                if 'filter_values_mv' in created:
+                    # View recém-atualizada: volta a valer também para os campos gravados antes
+                    mark_filter_values_mv_refreshed()
+                return {'success': not failed, 'created': created, 'failed': failed}
+            finally:
+                self.cursor.execute("RESET statement_timeout")
         except Exception as e:
             logger.error(f"Erro ao aplicar índices: {e}")
             return {'success': False, 'message': str(e)}
     
     def disconnect(self):
-        """Desconecta do banco de dados"""
+        """Devolve a conexão ao pool (idempotente)"""
+        connection, cursor = self.connection, self.cursor
+        self.connection = None
+        self.cursor = None
         try:
-            if self.cursor:
-                self.cursor.close()
-            if self.connection:
-                self.connection.close()
-            logger.info("Desconectado do banco")
+            if cursor and not cursor.closed:
+                cursor.close()
+            if connection is None:
+                return
+            discard = connection.closed
+            # Caminho normal sem ida ao banco: os ajustes por requisição são SET LOCAL e já
+            # terminaram com a transação. Só uma conexão largada no meio de uma transação
+            # (ou com erro) é desfeita e limpa antes de voltar ao pool
+            if not discard and connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    connection.rollback()
+                    connection.autocommit = True
+                    with connection.cursor() as reset_cursor:
+                        reset_cursor.execute("RESET ALL")
+                except psycopg2.Error:
+                    discard = True
+            get_db_pool().putconn(connection, close=discard)
+            logger.info("Conexão devolvida ao pool")
         except Exception as e:
             logger.error(f"Erro ao desconectar: {e}")
     
-    def get_precatorios_paginated(self, page: int = 1, per_page: int = 50, filters: Dict[str, str] = None, sort_field: str = 'ordem', sort_order: str = 'asc') -> Dict[str, Any]:
-        """Obtém precatórios com paginação, filtros e ordenação - otimizado para Vercel"""
+    @contextmanager
+    def transaction(self):
+        """Executa o bloco em uma transação explícita (a conexão do pool fica em autocommit)"""
+        self.connection.autocommit = False
+        try:
+            yield
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.connection.autocommit = True
+
+    def fetch_dicts_server_side(self, query: str, params: List[Any] = None, itersize: int = SERVER_SIDE_CURSOR_ITERSIZE) -> List[Dict[str, Any]]:
+        """Executa a consulta em um cursor nomeado (server-side), trazendo `itersize` linhas por ida ao banco"""
+        # Cursores nomeados exigem transação explícita
+        self.connection.autocommit = False
+        try:
+            data = []
+            cursor_name = f"precs_stream_{os.getpid()}_{time.time_ns()}"
+            with self.connection.cursor(name=cursor_name, cursor_factory=psycopg2.extensions.cursor) as stream_cursor:
+                stream_cursor.itersize = itersize
+                stream_cursor.execute(query, params or [])
+                columns = None
+                for row in stream_cursor:
+                    # description só fica disponível após o primeiro lote
+                    if columns is None:
+                        columns = [desc[0] for desc in stream_cursor.description]
+                    data.append(dict(zip(columns, row)))
+            self.connection.commit()
+            return data
+        except Exception:
+            self.connection.rollback()
+            raise
+        finally:
+            self.connection.autocommit = True
+
+    def iter_precatorios_batches(self, filters: Dict[str, Any], max_rows: int,
+                                 batch_size: int = CSV_EXPORT_BATCH_SIZE):
+        """Gera a listagem filtrada (por ordem) em lotes de dicts, lidos por cursor server-side.
+
+        A transação do cursor nomeado fica aberta entre os lotes; outras consultas na mesma
+        conexão (ex.: acumulativos do PEC 66) podem rodar entre um lote e outro.
+        """
+        where_conditions, params, _ = build_precatorios_list_conditions(filters)
+        query = build_precatorios_list_query(tuple(where_conditions), 'ordem', 'ASC')
+        # Referência local: entre um yield e outro self.connection pode já ter sido liberada
+        conn = self.connection
+        # Cursores nomeados exigem transação explícita
+        conn.autocommit = False
         try:
-            # Timeout de 20 segundos para queries mais rápidas (reduzido de 30s)
+            cursor_name = f"precs_export_{os.getpid()}_{time.time_ns()}"
+            with conn.cursor(name=cursor_name, cursor_factory=psycopg2.extensions.cursor) as stream_cursor:
+                stream_cursor.itersize = batch_size
+                stream_cursor.execute(query, params + [max_rows, 0])
+                columns = None
+                while True:
+                    rows = stream_cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    if columns is None:
+                        columns = [desc[0] for desc in stream_cursor.description]
+                    yield [dict(zip(columns, row)) for row in rows]
+            conn.commit()
+        except BaseException:
+            # Inclui GeneratorExit (cliente desistiu do download no meio)
+            conn.rollback()
+            raise
+        finally:
+            conn.autocommit = True
+
+    def copy_precatorios_csv(self, filters: Dict[str, Any], max_rows: int) -> str:
+        """Listagem filtrada (por ordem) como CSV gerado pelo próprio PostgreSQL (COPY TO STDOUT)"""
+        where_conditions, params, _ = build_precatorios_list_conditions(filters)
+        query = f"SELECT {EXPORT_COPY_SELECT} FROM {TABLE_NAME}"
+        if where_conditions:
+            query += " WHERE " + " AND ".join(where_conditions)
+        query += " ORDER BY ordem ASC, id ASC LIMIT %s"
+        with self.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as copy_cursor:
+            # COPY não aceita parâmetros: mogrify os escapa
+            copy_query = copy_cursor.mogrify(query, params + [max_rows]).decode('utf-8')
+            buffer = io.StringIO()
+            copy_cursor.copy_expert(
+                f"COPY ({copy_query}) TO STDOUT WITH (FORMAT CSV, HEADER, DELIMITER ';')", buffer
+            )
+        return buffer.getvalue()
+
+    def execute_prepared(self, cursor, query: str, params: List[Any]):
+        """Executa `query` via PREPARE/EXECUTE na conexão atual, pulando parse e plano nas repetições"""
+        if not prepared_statements_enabled():
+            cursor.execute(query, params)
+            return
+        name, prepare_sql, param_count = prepared_statement_for(query)
+        prepared = _prepared_statements.setdefault(self.connection, set())
+        if name not in prepared:
+            if len(prepared) >= PREPARED_STATEMENTS_PER_CONNECTION:
+                cursor.execute(query, params)
+                return
             try:
-                self.cursor.execute("SET statement_timeout TO 20000")
-            except Exception:
-                pass
-            # Campos específicos solicitados (ordenados conforme especificação)
-            # Incluindo todos os campos do banco que são necessários
-            fields = [
-                'id', 'precatorio', 'ordem', 'organizacao', 'prioridade', 'tribunal', 
-                'natureza', 'data_base', 'situacao', 'esta_na_ordem', 
-                'nao_esta_na_ordem', 'ano_orc', 'valor', 'presenca_no_pipe', 'regime'
-            ]
+                cursor.execute(prepare_sql)
+                prepared.add(name)
+            except psycopg2.Error as e:
+                logger.warning(f"Falha ao preparar consulta {name}: {e}")
+                cursor.execute(query, params)
+                return
+        placeholders = ", ".join(["%s"] * param_count)
+        try:
+            cursor.execute(f"EXECUTE {name} ({placeholders})" if param_count else f"EXECUTE {name}", params)
+        except psycopg2.errors.InvalidSqlStatementName:
+            # Sessão perdeu o statement (ex.: DISCARD ALL): executar direto e preparar de novo depois
+            prepared.discard(name)
+            cursor.execute(query, params)
+
+    def get_precatorios_paginated(self, page: int = 1, per_page: int = 50, filters: Dict[str, str] = None, sort_field: str = 'ordem', sort_order: str = 'asc', exact_count: bool = False, cursor_after: Optional[Tuple[Any, int]] = None) -> Dict[str, Any]:
+        """Obtém precatórios com paginação, filtros e ordenação - otimizado para Vercel.
+
+        Com `cursor_after` = (valor do campo de ordenação, id) do último registro da página
+        anterior, usa paginação por chave em vez de OFFSET.
+        """
+        try:
+            # Timeout de 20 segundos já vem das options da conexão (sem SET por requisição)
+            # Colunas: PRECATORIO_LIST_FIELDS (build_precatorios_list_query)
 
             # Validar campo de ordenação: permitir apenas colunas seguras/indexadas
-            safe_sort_fields = {'ordem', 'ano_orc', 'valor'}
-            if sort_field not in safe_sort_fields:
+            if sort_field not in SAFE_SORT_FIELDS:
                 sort_field = 'ordem'
             if sort_order.upper() not in ['ASC', 'DESC']:
                 sort_order = 'ASC'
             
-            # Construir query base
-            # Por enquanto, não calcular acumulativo na query (será calculado depois se necessário)
-            # Isso evita problemas de performance e sintaxe
-            fields_str = ', '.join(fields)
-            base_query = f"SELECT {fields_str} FROM {TABLE_NAME}"
-            # Contagem pode ser custosa; evitamos COUNT para não estourar timeout
-            count_query = None
-            
             # Adicionar filtros
-            where_conditions = []
-            params = []
-
-            # Processar filtro esta_na_ordem primeiro (filtro padrão se não especificado)
-            esta_na_ordem_filter = filters.get('esta_na_ordem', 'SIM').strip().upper() if filters else 'SIM'
-
-            # Validar valor do filtro esta_na_ordem
-            if esta_na_ordem_filter in ('TRUE', '1', 'SIM', 'S', 'YES', 'Y'):
-                where_conditions.append("esta_na_ordem = TRUE")
-            elif esta_na_ordem_filter in ('FALSE', '0', 'NÃO', 'NAO', 'N', 'NO'):
-                where_conditions.append("esta_na_ordem = FALSE")
-            elif esta_na_ordem_filter == '' or esta_na_ordem_filter == 'TODOS' or esta_na_ordem_filter == 'ALL':
-                # Não adiciona filtro (mostrar todos)
-                pass
-            else:
-                # Valor inválido - aplicar filtro padrão
-                where_conditions.append("esta_na_ordem = TRUE")
-
-            if filters:
-                for field, value in filters.items():
-                    # Pular esta_na_ordem pois já foi processado
-                    if field == 'esta_na_ordem':
-                        continue
+            where_conditions, params, custom_keys = build_precatorios_list_conditions(filters)
 
-                    # Permitir filtros especiais que não são colunas diretas
-                    is_special_range = field in ('valor_min', 'valor_max')
-                    if value and (field in fields or is_special_range):
-                        # Para filtros de valor range (valor_min e valor_max)
-                        if field == 'valor_min':
-                            try:
-                                # Converter valor mínimo para float
-                                normalized_val = value.replace('R$', '').replace(' ', '').replace(',', '.')
-                                normalized_val = re.sub(r"[^0-9.]", "", normalized_val)
-                                if normalized_val:
-                                    valor_min_float = float(normalized_val)
-                                    where_conditions.append(f"valor >= %s")
-                                    params.append(valor_min_float)
-                            except (ValueError, TypeError):
-                                logger.warning(f"Valor mínimo inválido: {value}")
-                                continue
-                        elif field == 'valor_max':
-                            try:
-                                # Converter valor máximo para float
-                                normalized_val = value.replace('R$', '').replace(' ', '').replace(',', '.')
-                                normalized_val = re.sub(r"[^0-9.]", "", normalized_val)
-                                if normalized_val:
-                                    valor_max_float = float(normalized_val)
-                                    where_conditions.append(f"valor <= %s")
-                                    params.append(valor_max_float)
-                            except (ValueError, TypeError):
-                                logger.warning(f"Valor máximo inválido: {value}")
-                                continue
-                        # Para campos booleanos (exceto esta_na_ordem que já foi processado), converter string para boolean
-                        elif field in ['nao_esta_na_ordem', 'presenca_no_pipe']:
-                            # Converter string 'SIM'/'NAO' para boolean PostgreSQL
-                            if isinstance(value, str):
-                                value_upper = value.strip().upper()
-                                bool_value = value_upper in ('TRUE', '1', 'SIM', 'S', 'YES', 'Y')
-                            else:
-                                bool_value = bool(value)
-                            where_conditions.append(f"{field} = %s")
-                            params.append(bool_value)
-                        # Para ordem, garantir que seja integer (comparação exata ou ILIKE para busca parcial)
-                        elif field == 'ordem':
-                            try:
-                                # Se o valor contém apenas dígitos, tratar como integer
-                                digits_only = re.sub(r"[^0-9]", "", str(value))
-                                if digits_only and digits_only == str(value).strip():
-                                    ordem_int = int(digits_only)
-                                    where_conditions.append(f"{field} = %s")
-                                    params.append(ordem_int)
-                                else:
-                                    # Se contém outros caracteres, usar ILIKE para busca parcial (como texto)
-                                    where_conditions.append(f"CAST({field} AS TEXT) ILIKE %s")
-                                    params.append(f"%{value}%")
-                            except (ValueError, TypeError):
-                                logger.warning(f"Valor inválido para filtro de {field}: {value}")
-                                continue
-                        # Para ano_orc, garantir que seja integer (pode ser lista ou valor único)
-                        elif field == 'ano_orc':
-                            try:
-                                # Se for lista (múltipla seleção)
-                                if isinstance(value, list):
-                                    anos_int = [int(v) for v in value if v]
-                                    if len(anos_int) > 0:
-                                        placeholders = ','.join(['%s'] * len(anos_int))
-                                        where_conditions.append(f"{field} IN ({placeholders})")
-                                        params.extend(anos_int)
-                                else:
-                                    # Valor único
-                                    ano_int = int(value) if value else None
-                                    if ano_int is not None:
-                                        where_conditions.append(f"{field} = %s")
-                                        params.append(ano_int)
-                            except (ValueError, TypeError):
-                                logger.warning(f"Valor inválido para filtro de {field}: {value}")
-                                continue
-                        # Para campos dropdown texto, usar comparação exata ou IN para múltiplos valores
-                        elif field in ['organizacao', 'prioridade', 'tribunal', 'natureza', 'situacao', 'regime']:
-                            # Se for lista (múltipla seleção), usar IN
-                            if isinstance(value, list):
-                                if len(value) > 0:
-                                    placeholders = ','.join(['%s'] * len(value))
-                                    where_conditions.append(f"{field} IN ({placeholders})")
-                                    params.extend(value)
-                            else:
-                                # Valor único, usar =
-                                where_conditions.append(f"{field} = %s")
-                                params.append(value)
-                        else:
-                            # Para outros campos texto (como precatorio), usar ILIKE
-                            where_conditions.append(f"{field} ILIKE %s")
-                            params.append(f"%{value}%")
-            
-            if where_conditions:
-                where_clause = " WHERE " + " AND ".join(where_conditions)
-                # Aplicar WHERE na query externa (após o CTE)
-                base_query += where_clause
-                if count_query is not None:
-                    count_query += where_clause
+            # Caminho rápido da tela inicial (na ordem, sem filtros, por ordem ASC): a maioria
+            # das requisições; usa o SQL pré-montado sem passar pelo despacho de filtros
+            is_default_view = (
+                not custom_keys and where_conditions == ["esta_na_ordem = TRUE"]
+                and sort_field == 'ordem' and sort_order.upper() == 'ASC'
+            )
             
-            # Adicionar ordenação apenas se campo for seguro
-            # Usar índice composto quando possível para melhor performance
-            if sort_field in safe_sort_fields:
-                # Se ordenando por ordem e há filtro esta_na_ordem, o índice composto será usado
-                base_query += f" ORDER BY {sort_field} {sort_order.upper()}"
-            else:
-                # Fallback: sempre ordenar por ordem se campo não for seguro
-                base_query += " ORDER BY ordem ASC"
+            # OFFSET nunca muito além do fim da tabela: page=1000000 viraria milhões de linhas lidas
+            # e descartadas até o statement_timeout. reltuples (cache de 5 minutos) limita qualquer
+            # filtro; a página extra cobre estimativa um pouco desatualizada
+            page = max(int(page), 1)
+            per_page = min(max(int(per_page), 1), LIST_MAX_PER_PAGE)
+            if cursor_after is None and page > 1:
+                table_rows = self.estimate_table_rows(TABLE_NAME)
+                if table_rows:
+                    page = min(page, (table_rows + per_page - 1) // per_page + 1)
             
-            # Adicionar paginação
+            # SQL montado a partir do formato (condições + ordenação) e reaproveitado do cache;
+            # paginação vai como parâmetro para não fragmentar o cache
             offset = (page - 1) * per_page
-            base_query += f" LIMIT {per_page} OFFSET {offset}"
+            if cursor_after is not None:
+                # Paginação por chave: um ou dois trechos (ver KEYSET_SEGMENTS). Registros na ordem
+                # sempre têm ordem preenchida: por ordem, basta a busca após (ordem, id)
+                last_value, last_id = cursor_after
+                segments = KEYSET_SEGMENTS[(sort_order.upper(), last_value is None)]
+                if sort_field == 'ordem' and "esta_na_ordem = TRUE" in where_conditions:
+                    segments = segments[:1]
+                segment_params = {
+                    'after': [last_value, last_id], 'null_after': [last_id], 'nulls': [], 'not_null': [],
+                }
+                page_queries = [
+                    (build_precatorios_list_query(tuple(where_conditions), sort_field, sort_order.upper(), segment),
+                     params + segment_params[segment], [])
+                    for segment in segments
+                ]
+            else:
+                if is_default_view:
+                    base_query = DEFAULT_LIST_QUERY
+                else:
+                    base_query = build_precatorios_list_query(tuple(where_conditions), sort_field, sort_order.upper())
+                # (consulta, parâmetros antes do LIMIT, parâmetros após o LIMIT)
+                page_queries = [(base_query, params, [offset])]
             
             # Executar query principal primeiro (para evitar timeouts em COUNT)
             # Usar EXPLAIN para debug se necessário
-            logger.info(f"Executando query: {base_query[:200]}... com {len(params)} parâmetros")
             start_time = time.time()
+            data = []
             try:
-                self.cursor.execute(base_query, params)
-                data = self.cursor.fetchall()
+                # Trechos em sequência até completar a página (o segundo trecho da paginação por
+                # chave só é consultado na fronteira entre valores preenchidos e NULLs)
+                for base_query, params_before_limit, params_after_limit in page_queries:
+                    logger.info(f"Executando query: {base_query[:200]}... com {len(params)} parâmetros")
+                    page_params = params_before_limit + [per_page - len(data)] + params_after_limit
+                    if per_page > SERVER_SIDE_CURSOR_THRESHOLD:
+                        # Páginas grandes: trazer em lotes via cursor nomeado
+                        data.extend(self.fetch_dicts_server_side(base_query, page_params))
+                    else:
+                        # Cursor de tuplas + montagem dos dicts por coluna: evita o RealDictRow
+                        # intermediário e a cópia dict(row) por linha
+                        with self.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as list_cursor:
+                            self.execute_prepared(list_cursor, base_query, page_params)
+                            columns = [desc[0] for desc in list_cursor.description]
+                            data.extend(dict(zip(columns, row)) for row in list_cursor.fetchall())
+                    if len(data) >= per_page:
+                        break
                 query_time = time.time() - start_time
                 logger.info(f"Query executada em {query_time:.2f}s, retornou {len(data)} registros")
             except psycopg2.Error as e:
@@ -357,35 +1153,46 @@ class DatabaseManager:
                 logger.error(f"Query completa: {base_query}")
                 raise
 
-            # Determinar se precisamos fazer COUNT() real
-            # Se houver filtros além do filtro padrão esta_na_ordem, fazer COUNT()
-            # Caso contrário, usar valor fixo conhecido
-            has_custom_filters = False
-            if filters:
-                # Verificar se há filtros além do esta_na_ordem padrão
-                for key, value in filters.items():
-                    if key != 'esta_na_ordem' and value:
-                        has_custom_filters = True
-                        break
+            # Total de registros sem COUNT(*) (O(N) em tabelas grandes):
+            # - apenas o filtro padrão esta_na_ordem=TRUE: valor fixo conhecido
+            # - sem nenhum filtro: pg_class.reltuples
+            # - demais filtros: estimativa do planner (EXPLAIN)
+            # COUNT(*) exato somente quando solicitado explicitamente (?exact_count=1)
+            has_custom_filters = bool(custom_keys)
 
-            if has_custom_filters:
-                # Fazer COUNT() para filtros personalizados
+            count_from = f" FROM {TABLE_NAME}"
+            if where_conditions:
+                count_from += " WHERE " + " AND ".join(where_conditions)
+
+            total_is_estimate = not exact_count
+            if exact_count:
                 try:
-                    count_query = f"SELECT COUNT(*) FROM {TABLE_NAME}"
-                    if where_conditions:
-                        count_query += " WHERE " + " AND ".join(where_conditions)
-                    self.cursor.execute(count_query, params)
-                    count_result = self.cursor.fetchone()
-                    total_count = count_result['count'] if isinstance(count_result, dict) else count_result[0]
-                except Exception as e:
+                    # Mesmo formato de filtro em todas as páginas: plano reaproveitado
+                    self.execute_prepared(self.cursor, f"SELECT COUNT(*) AS count{count_from}", params)
+                    total_count = int(self.cursor.fetchone()['count'])
+                except psycopg2.Error as e:
                     logger.warning(f"Erro ao contar registros filtrados: {e}")
-                    # Fallback: estimar baseado nos resultados
-                    total_count = len(data) if page == 1 else len(data) * page
+                    total_count = self.estimate_query_rows(f"SELECT 1{count_from}", params)
+                    total_is_estimate = True
+            elif len(data) < per_page:
+                # Página incompleta: total exato sem consulta extra (se ela não estiver além do fim)
+                total_count = offset + len(data)
+                total_is_estimate = not data and offset > 0
+            elif not has_custom_filters and where_conditions == ["esta_na_ordem = TRUE"]:
+                # Evita query COUNT() lenta que causa timeouts: estimativa do catálogo (cache de
+                # 5 minutos), que acompanha a tabela em vez de um número fixo
+                total_count = self.estimate_table_rows(IN_ORDEM_INDEX_NAME) or TOTAL_RECORDS_IN_ORDEM
+            elif not where_conditions:
+                total_count = self.estimate_table_rows(TABLE_NAME)
             else:
-                # Usar count fixo conhecido: 84,405 registros com esta_na_ordem=TRUE
-                # Evita query COUNT() lenta que causa timeouts
-                TOTAL_RECORDS_IN_DB = 84405
-                total_count = TOTAL_RECORDS_IN_DB
+                total_count = self.estimate_query_rows(f"SELECT 1{count_from}", params)
+
+            # A página atual delimita a estimativa: página incompleta fornece o total exato
+            if total_is_estimate:
+                if len(data) < per_page:
+                    total_count = offset + len(data)
+                else:
+                    total_count = max(total_count, offset + len(data) + 1)
             
             # Calcular paginação
             total_pages = (total_count + per_page - 1) // per_page
@@ -399,11 +1206,14 @@ class DatabaseManager:
                 'has_prev': page > 1,
                 'has_next': page < total_pages,
                 'prev_num': page - 1 if page > 1 else None,
-                'next_num': page + 1 if page < total_pages else None
+                'next_num': page + 1 if page < total_pages else None,
+                'total_is_estimate': total_is_estimate,
+                # Cursor para a próxima página (paginação por chave, ordenação por ordem)
+                'next_cursor': encode_precatorios_cursor(data[-1], sort_field) if len(data) == per_page else None
             }
             
             return {
-                'data': [dict(row) for row in data],
+                'data': data,
                 'pagination': pagination
             }
             
@@ -432,15 +1242,38 @@ class DatabaseManager:
     
     def get_filter_values(self, field: str, use_cache: bool = True, limit_count: int = None, search_term: str = None, active_filters: Dict[str, str] = None) -> List[str]:
         """Obtém valores únicos para um campo específico - DINÂMICO baseado em filtros ativos"""
-        global _filter_values_cache, _filter_cache_timestamp
-        
         # Campos pequenos: carregar TODOS de uma vez (prioridade, tribunal, natureza, regime, situacao)
         small_fields = ['prioridade', 'tribunal', 'natureza', 'regime', 'situacao', 'ano_orc']
         is_small_field = field in small_fields
         
-        # Se há filtros ativos, não usar cache (valores são dinâmicos)
-        if active_filters:
-            use_cache = False
+        # Chave hashable (campo + filtros ativos): valores dinâmicos também são cacheados
+        cache_key = filter_values_cache_key(field, active_filters)
+        
+        # Verificar cache primeiro, antes de tocar no banco
+        if use_cache:
+            cached_values = get_cached_filter_values(cache_key)
+            if cached_values is not None:
+                # Se há termo de busca, filtrar do cache
+                if search_term:
+                    search_lower = search_term.lower()
+                    filtered = [v for v in cached_values if search_lower in v.lower()]
+                    if limit_count:
+                        filtered = filtered[:limit_count]
+                    return filtered
+                # Se pediu um limite menor, retornar apenas os primeiros
+                if limit_count and limit_count < len(cached_values):
+                    return list(cached_values[:limit_count])
+                return list(cached_values)
+        
+        # Buscas (autocomplete) sem a lista completa em cache: memoizadas por termo e limite,
+        # no mesmo LRU (as mesmas buscas se repetem a cada tecla/requisição)
+        search_cache_key = None
+        if search_term:
+            search_cache_key = cache_key + (('__busca', search_term.lower(), limit_count),)
+            if use_cache:
+                cached_values = get_cached_filter_values(search_cache_key)
+                if cached_values is not None:
+                    return list(cached_values)
         
         # Garantir que há conexão válida antes de usar
         if not self.connection or self.connection.closed:
@@ -457,25 +1290,15 @@ class DatabaseManager:
                 if not self.connect():
                     return []
         
-        # Verificar cache primeiro (aumentado para 1 hora para melhor performance)
-        if use_cache:
-            now = datetime.now()
-            cache_key = field
-            if cache_key in _filter_values_cache and cache_key in _filter_cache_timestamp:
-                cache_age = now - _filter_cache_timestamp[cache_key]
-                if cache_age < timedelta(hours=1):  # Cache válido por 1 hora
-                    cached_values = _filter_values_cache[cache_key]
-                    # Se há termo de busca, filtrar do cache
-                    if search_term:
-                        search_lower = search_term.lower()
-                        filtered = [v for v in cached_values if search_lower in v.lower()]
-                        if limit_count:
-                            filtered = filtered[:limit_count]
-                        return filtered
-                    # Se pediu um limite menor, retornar apenas os primeiros
-                    if limit_count and limit_count < len(cached_values):
-                        return cached_values[:limit_count]
-                    return cached_values
+        # Sem filtros ativos nem busca: leitura direta da materialized view, sem DISTINCT
+        if not search_term and not build_filter_values_conditions(field, active_filters)[0] \
+                and filter_values_mv_fields([field]):
+            mv_results = self.get_filter_values_from_mv([field], limit_count)
+            if mv_results is not None:
+                values = mv_results[field]
+                if use_cache and (is_small_field or limit_count is None):
+                    store_filter_values(cache_key, values)
+                return values
         
         try:
             # Timeout ajustado por tipo de campo
@@ -490,105 +1313,35 @@ class DatabaseManager:
                     # Organização: sem limite quando None (carregar TODAS)
                     limit_count = None  # Manter None para carregar todas
             
-            try:
-                # Verificar se cursor ainda está válido antes de usar
-                if not self.cursor or self.cursor.closed:
-                    self.cursor = self.connection.cursor()
-                self.cursor.execute(f"SET statement_timeout TO {timeout}")
-                # Desabilitar sequential scan para forçar uso de índices
-                self.cursor.execute("SET enable_seqscan = off")
-            except Exception as e:
-                logger.warning(f"Erro ao configurar timeout para {field}: {e}")
-                # Tentar recriar cursor se necessário
-                if not self.cursor or self.cursor.closed:
-                    try:
-                        self.cursor = self.connection.cursor()
-                    except:
-                        if not self.connect():
-                            return []
+            # Timeout segue no mesmo envio da consulta, sem ida extra ao banco, e com SET LOCAL
+            # vale só para ela. O planner escolhe o plano livremente (sem enable_seqscan):
+            # os índices parciais *_ordem_partial (OPTIMIZATION_INDEXES) cobrem esta consulta
+            session_settings = f"SET LOCAL statement_timeout TO {int(timeout)}; {FILTER_VALUES_WORK_MEM_SETTING}"
             
             # Construir WHERE clause com filtros ativos (dinâmico)
             where_conditions = ["esta_na_ordem = TRUE", f"{field} IS NOT NULL"]
-            params = []
             
             # Aplicar filtros ativos (exceto o próprio campo que estamos buscando)
-            if active_filters:
-                for filter_field, filter_value in active_filters.items():
-                    # Não aplicar filtro no próprio campo
-                    if filter_field != field and filter_value:
-                        # Campos de texto: usar igualdade exata ou IN para múltiplos valores
-                        if filter_field in ['organizacao', 'precatorio', 'tribunal', 'natureza', 'situacao', 'regime', 'prioridade']:
-                            # Se for string com vírgulas (múltiplos valores), converter para lista
-                            if isinstance(filter_value, str) and ',' in filter_value:
-                                filter_values_list = [v.strip() for v in filter_value.split(',') if v.strip()]
-                                if len(filter_values_list) > 1:
-                                    placeholders = ','.join(['%s'] * len(filter_values_list))
-                                    where_conditions.append(f"{filter_field} IN ({placeholders})")
-                                    params.extend(filter_values_list)
-                                elif len(filter_values_list) == 1:
-                                    where_conditions.append(f"{filter_field} = %s")
-                                    params.append(filter_values_list[0])
-                            elif isinstance(filter_value, list):
-                                if len(filter_value) > 1:
-                                    placeholders = ','.join(['%s'] * len(filter_value))
-                                    where_conditions.append(f"{filter_field} IN ({placeholders})")
-                                    params.extend(filter_value)
-                                elif len(filter_value) == 1:
-                                    where_conditions.append(f"{filter_field} = %s")
-                                    params.append(filter_value[0])
-                            else:
-                                where_conditions.append(f"{filter_field} = %s")
-                                params.append(filter_value)
-                        # Campos numéricos: igualdade exata ou IN
-                        elif filter_field in ['ordem', 'ano_orc']:
-                            try:
-                                # Se for string com vírgulas (múltiplos valores)
-                                if isinstance(filter_value, str) and ',' in filter_value:
-                                    filter_values_list = [int(v.strip()) for v in filter_value.split(',') if v.strip()]
-                                    if len(filter_values_list) > 1:
-                                        placeholders = ','.join(['%s'] * len(filter_values_list))
-                                        where_conditions.append(f"{filter_field} IN ({placeholders})")
-                                        params.extend(filter_values_list)
-                                    elif len(filter_values_list) == 1:
-                                        where_conditions.append(f"{filter_field} = %s")
-                                        params.append(filter_values_list[0])
-                                elif isinstance(filter_value, list):
-                                    filter_values_list = [int(v) for v in filter_value if v]
-                                    if len(filter_values_list) > 1:
-                                        placeholders = ','.join(['%s'] * len(filter_values_list))
-                                        where_conditions.append(f"{filter_field} IN ({placeholders})")
-                                        params.extend(filter_values_list)
-                                    elif len(filter_values_list) == 1:
-                                        where_conditions.append(f"{filter_field} = %s")
-                                        params.append(filter_values_list[0])
-                                else:
-                                    where_conditions.append(f"{filter_field} = %s")
-                                    params.append(int(filter_value))
-                            except (ValueError, TypeError):
-                                pass
-                        # Campos booleanos
-                        elif filter_field == 'esta_na_ordem':
-                            where_conditions.append(f"{filter_field} = %s")
-                            params.append(filter_value.lower() == 'true')
-                        # Campo valor (já tratado separadamente)
-                        elif filter_field == 'valor':
-                            try:
-                                where_conditions.append(f"{filter_field} <= %s")
-                                params.append(float(filter_value))
-                            except (ValueError, TypeError):
-                                pass
+            extra_conditions, params = build_filter_values_conditions(field, active_filters)
+            where_conditions.extend(extra_conditions)
             
             # Adicionar busca por termo se houver
             if search_term:
-                search_pattern = f"%{search_term}%"
-                where_conditions.append(f"{field} ILIKE %s")
+                search_pattern = f"%{escape_like(search_term)}%"
+                where_conditions.append(f"{field} ILIKE %s ESCAPE '\\'")
                 params.append(search_pattern)
             
             where_clause = " AND ".join(where_conditions)
             
             # ESTRATÉGIA OTIMIZADA: usar GROUP BY para campos pequenos (mais rápido)
             # Para organização, usar ORDER BY + LIMIT e filtrar únicos em Python
-            if is_small_field:
+            if is_small_field and not extra_conditions and not search_term:
+                # Sem filtros: loose index scan (poucos valores distintos, muitos registros)
+                query = (
+                    f"WITH RECURSIVE {skip_scan_cte(field)} "
+                    f"SELECT v AS {field} FROM skip_{field} WHERE v IS NOT NULL ORDER BY v"
+                )
+            elif is_small_field:
                 query = (
                     f"SELECT {field} "
                     f"FROM {TABLE_NAME} "
@@ -629,7 +1382,7 @@ class DatabaseManager:
                 else:
                     self.cursor = self.connection.cursor()
             
-            self.cursor.execute(query, params)
+            self.cursor.execute(session_settings + query, params)
             all_results = self.cursor.fetchall()
             query_time = time.time() - start_time
             
@@ -654,26 +1407,30 @@ class DatabaseManager:
             if len(values) == 0:
                 logger.warning(f"Nenhum valor encontrado para {field}")
             
-            # Atualizar cache (apenas se não houver busca)
-            if use_cache and not search_term:
-                _filter_values_cache[cache_key] = values
-                _filter_cache_timestamp[cache_key] = datetime.now()
+            # Atualizar cache (apenas se não houver busca nem LIMIT truncando o resultado);
+            # resultados vazios também são cacheados, com TTL menor
+            if use_cache and not search_term and (is_small_field or limit_count is None):
+                store_filter_values(cache_key, values)
                 logger.info(f"Cache atualizado para {field}: {len(values)} valores")
+            elif use_cache and search_cache_key is not None:
+                store_filter_values(search_cache_key, values)
             
             return values
         except psycopg2.OperationalError as e:
             logger.error(f"Erro operacional ao buscar valores para {field}: {e}")
             # Retornar cache antigo se disponível
-            if use_cache and cache_key in _filter_values_cache:
+            stale_values = get_cached_filter_values(cache_key, allow_stale=True) if use_cache else None
+            if stale_values is not None:
                 logger.warning(f"Usando cache antigo para {field} devido a erro")
-                return _filter_values_cache[cache_key]
+                return list(stale_values)
             return []
         except psycopg2.Error as e:
             logger.error(f"Erro PostgreSQL ao buscar valores para {field}: {e}")
             # Retornar cache antigo se disponível
-            if use_cache and cache_key in _filter_values_cache:
+            stale_values = get_cached_filter_values(cache_key, allow_stale=True) if use_cache else None
+            if stale_values is not None:
                 logger.warning(f"Usando cache antigo para {field} devido a erro")
-                return _filter_values_cache[cache_key]
+                return list(stale_values)
             if self.connection:
                 try:
                     self.connection.rollback()
@@ -681,49 +1438,208 @@ class DatabaseManager:
                     pass
             return []
         except Exception as e:
-            logger.error(f"Erro inesperado ao buscar valores para {field}: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Erro inesperado ao buscar valores para {field}: {e}")
             # Retornar cache antigo se disponível
-            if use_cache and cache_key in _filter_values_cache:
+            stale_values = get_cached_filter_values(cache_key, allow_stale=True) if use_cache else None
+            if stale_values is not None:
                 logger.warning(f"Usando cache antigo para {field} devido a erro")
-                return _filter_values_cache[cache_key]
+                return list(stale_values)
             return []
 
-    def get_all_filter_values(self, fields: List[str]) -> Dict[str, List[str]]:
-        """Obtém valores únicos para múltiplos campos otimizado"""
+    def get_filter_values_from_mv(self, fields: List[str], limit_count: int = None) -> Optional[Dict[str, List[str]]]:
+        """Valores (sem filtros ativos) lidos da materialized view, ou None se indisponível"""
+        global _filter_values_mv_enabled
         try:
-            results = {}
-            
-            # Executar queries de forma otimizada (limitar resultados e usar índices)
-            for field in fields:
-                try:
-                    # Limitar a 50 resultados para melhorar performance e evitar timeout
-                    query = f"SELECT DISTINCT {field} FROM {TABLE_NAME} WHERE {field} IS NOT NULL AND esta_na_ordem = TRUE ORDER BY {field} LIMIT 50"
-                    self.cursor.execute(query)
-                    field_results = self.cursor.fetchall()
-                    results[field] = [str(row[field]) for row in field_results if row[field] is not None]
-                except psycopg2.Error as e:
-                    logger.warning(f"Erro ao buscar valores únicos para {field}: {e}")
-                    results[field] = []
-            
+            limit_clause = "AND pos <= %s " if limit_count else ""
+            params = [list(fields)] + ([limit_count] if limit_count else [])
+            with self.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as mv_cursor:
+                mv_cursor.execute(
+                    f"SELECT field, value FROM {FILTER_VALUES_MV} "
+                    f"WHERE field = ANY(%s) {limit_clause}ORDER BY field, pos",
+                    params
+                )
+                rows = mv_cursor.fetchall()
+        except psycopg2.errors.UndefinedTable:
+            # View ainda não criada (/admin/apply_indexes?which=filter_values_mv): não tentar de novo
+            logger.warning(f"{FILTER_VALUES_MV} não existe; dropdowns seguem com consulta ao vivo")
+            _filter_values_mv_enabled = False
+            return None
+        except psycopg2.Error as e:
+            logger.warning(f"Falha ao ler {FILTER_VALUES_MV}: {e}")
+            return None
+        results = {field: [] for field in fields}
+        for field, value in rows:
+            results[field].append(value)
+        return results
+
+    def get_all_filter_values(self, fields: List[str], active_filters: Dict[str, Any] = None) -> Dict[str, List[str]]:
+        """Obtém valores únicos de vários campos em UMA consulta (CTE lida uma vez + UNION ALL por campo)"""
+        cache_fields = [f for f in fields if f in FILTER_VALUES_FUSABLE_FIELDS]
+        try:
+            if not cache_fields:
+                return {field: [] for field in fields}
+            if not self.connection or self.connection.closed:
+                if not self.connect():
+                    return {field: [] for field in fields}
+
+            extra_conditions, params = build_filter_values_conditions(None, active_filters)
+            mv_fields = [] if extra_conditions else filter_values_mv_fields(cache_fields)
+            if mv_fields and len(mv_fields) == len(cache_fields):
+                mv_results = self.get_filter_values_from_mv(cache_fields)
+                if mv_results is not None:
+                    results = {field: mv_results.get(field, []) for field in fields}
+                    for field in cache_fields:
+                        store_filter_values(filter_values_cache_key(field, active_filters), results[field])
+                    return results
+            if extra_conditions:
+                where_clause = " AND ".join(["esta_na_ordem = TRUE"] + extra_conditions)
+                # A CTE é referenciada por todos os ramos, então é materializada: um único scan
+                # dos registros na ordem, agrupado por campo (pos mantém a ordenação nativa de cada um)
+                branches = [
+                    f"SELECT '{field}' AS field, {field}::text AS v, row_number() OVER (ORDER BY {field}) AS pos "
+                    f"FROM base WHERE {field} IS NOT NULL GROUP BY {field}"
+                    for field in cache_fields
+                ]
+                query = (
+                    f"SET LOCAL statement_timeout TO 8000; {FILTER_VALUES_WORK_MEM_SETTING}"
+                    f"WITH base AS (SELECT {', '.join(cache_fields)} FROM {TABLE_NAME} WHERE {where_clause}) "
+                    + " UNION ALL ".join(branches)
+                    + " ORDER BY field, pos"
+                )
+            else:
+                # Sem filtros ativos: "loose index scan" recursivo por campo sobre os índices
+                # parciais idx_precs_ord_<campo>_partial — um salto no índice por valor distinto
+                # (O(D log N)) em vez de ler todos os registros na ordem
+                skip_scans = [skip_scan_cte(field) for field in cache_fields]
+                branches = [
+                    f"SELECT '{field}' AS field, v::text AS v, row_number() OVER (ORDER BY v) AS pos "
+                    f"FROM skip_{field} WHERE v IS NOT NULL"
+                    for field in cache_fields
+                ]
+                query = (
+                    f"SET LOCAL statement_timeout TO 8000; {FILTER_VALUES_WORK_MEM_SETTING}"
+                    f"WITH RECURSIVE {', '.join(skip_scans)} "
+                    + " UNION ALL ".join(branches)
+                    + " ORDER BY field, pos"
+                )
+            start_time = time.time()
+            with self.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as values_cursor:
+                values_cursor.execute(query, params)
+                rows = values_cursor.fetchall()
+
+            results = {field: [] for field in fields}
+            for field, value, _ in rows:
+                results[field].append(value)
+            logger.info(f"Valores de {len(cache_fields)} campos obtidos em uma consulta ({time.time() - start_time:.2f}s)")
+
+            # Mesmo formato/chave de get_filter_values: chamadas individuais aproveitam o cache
+            for field in cache_fields:
+                store_filter_values(filter_values_cache_key(field, active_filters), results[field])
             return results
-        except Exception as e:
+        except psycopg2.Error as e:
             logger.error(f"Erro ao buscar valores únicos em batch: {e}")
-            if self.connection:
-                self.connection.rollback()
             return {field: [] for field in fields}
-    
+
+    def get_filter_values_batch(self, specs: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+        """Carrega vários dropdowns em paralelo: {campo: kwargs de get_filter_values} -> {campo: valores}
+
+        Cada thread usa sua própria conexão do pool; o psycopg2 libera o GIL durante a
+        espera do libpq, então N consultas custam ~1 ida ao banco em vez de N.
+        """
+        results = {}
+        pending = []
+        for field, kwargs in specs.items():
+            cached_values = None
+            if kwargs.get('use_cache', True) and not kwargs.get('search_term'):
+                cached_values = get_cached_filter_values(filter_values_cache_key(field, kwargs.get('active_filters')))
+            if cached_values is not None:
+                limit_count = kwargs.get('limit_count')
+                results[field] = list(cached_values[:limit_count] if limit_count else cached_values)
+            else:
+                pending.append(field)
+
+        def fetch(field: str) -> Optional[List[str]]:
+            worker_db = DatabaseManager()
+            try:
+                # Pool esgotado: devolve None e o campo é carregado depois, na conexão principal
+                if not worker_db.connect():
+                    return None
+                return worker_db.get_filter_values(field, **specs[field])
+            finally:
+                worker_db.disconnect()
+
+        # Campos pequenos com os mesmos filtros ativos saem juntos de uma consulta só
+        fused_groups = defaultdict(list)
+        for field in pending:
+            kwargs = specs[field]
+            active_filters = kwargs.get('active_filters')
+            if (field in FILTER_VALUES_FUSABLE_FIELDS and kwargs.get('use_cache', True)
+                    and not kwargs.get('search_term') and field not in (active_filters or {})):
+                fused_groups[filter_values_cache_key('', active_filters)].append(field)
+        units = []
+        fused_fields = set()
+        for group in fused_groups.values():
+            if len(group) > 1:
+                units.append(group)
+                fused_fields.update(group)
+        units.extend([field] for field in pending if field not in fused_fields)
+
+        def fetch_unit(unit: List[str]) -> Optional[Dict[str, List[str]]]:
+            if len(unit) == 1:
+                values = fetch(unit[0])
+                return None if values is None else {unit[0]: values}
+            worker_db = DatabaseManager()
+            try:
+                if not worker_db.connect():
+                    return None
+                return worker_db.get_all_filter_values(unit, specs[unit[0]].get('active_filters'))
+            finally:
+                worker_db.disconnect()
+
+        # Reservar uma conexão do pool para a própria requisição
+        if PARALLEL_FILTER_VALUES and len(units) > 1 and DB_POOL_MAX > 2:
+            for unit_values in get_filter_values_executor().map(fetch_unit, units):
+                if unit_values is not None:
+                    results.update(unit_values)
+
+        for field in pending:
+            if field not in results:
+                results[field] = self.get_filter_values(field, **specs[field])
+            limit_count = specs[field].get('limit_count')
+            if limit_count:
+                results[field] = results[field][:limit_count]
+        return results
+
     def get_table_structure(self) -> Dict[str, Any]:
-        """Retorna a estrutura da tabela precatorios para diagnóstico"""
+        """Retorna a estrutura da tabela precatorios para diagnóstico (memória > snapshot em disco > banco)"""
+        global _table_structure_cache
+        if _table_structure_cache is not None and time.monotonic() - _table_structure_cache[0] < TABLE_STRUCTURE_TTL:
+            return _table_structure_cache[1]
+
+        snapshot = read_snapshot(STRUCTURE_SNAPSHOT, STRUCTURE_SNAPSHOT_TTL)
+        if snapshot is not None:
+            _table_structure_cache = (time.monotonic(), snapshot)
+            return snapshot
+
         try:
+            if not self.connection or self.connection.closed:
+                if not self.connect():
+                    return {}
+
+            # Catálogo direto (pg_attribute) em vez da view information_schema.columns, que junta
+            # várias tabelas de catálogo com filtros de privilégio; mesmas colunas de saída
             query = """
-                SELECT column_name, data_type, is_nullable, character_maximum_length, numeric_precision, numeric_scale
-                FROM information_schema.columns
-                WHERE table_name = %s AND table_schema = 'public'
-                ORDER BY ordinal_position
+                SELECT a.attname AS column_name,
+                       format_type(a.atttypid, NULL) AS data_type,
+                       CASE WHEN a.attnotnull THEN 'NO' ELSE 'YES' END AS is_nullable,
+                       information_schema._pg_char_max_length(a.atttypid, a.atttypmod) AS character_maximum_length,
+                       information_schema._pg_numeric_precision(a.atttypid, a.atttypmod) AS numeric_precision,
+                       information_schema._pg_numeric_scale(a.atttypid, a.atttypmod) AS numeric_scale
+                FROM pg_attribute a
+                WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+                ORDER BY a.attnum
             """
-            self.cursor.execute(query, [TABLE_NAME])
+            self.cursor.execute(query, [f"public.{TABLE_NAME}"])
             columns = self.cursor.fetchall()
             
             structure = {}
@@ -736,6 +1652,9 @@ class DatabaseManager:
                     'numeric_scale': col['numeric_scale']
                 }
             
+            if structure:
+                write_snapshot(STRUCTURE_SNAPSHOT, structure)
+                _table_structure_cache = (time.monotonic(), structure)
             return structure
         except psycopg2.Error as e:
             logger.error(f"Erro ao obter estrutura da tabela: {e}")
@@ -743,36 +1662,84 @@ class DatabaseManager:
                 self.connection.rollback()
             return {}
 
-    def get_quick_stats(self) -> Dict[str, Any]:
-        """Métricas rápidas para validar comunicação e dados no banco."""
+    def get_quick_stats(self, exact: bool = False) -> Dict[str, Any]:
+        """Métricas rápidas para validar comunicação e dados no banco (snapshot em disco).
+
+        Contagens vêm de pg_class.reltuples; `exact` força COUNT(*) dos registros na ordem.
+        """
+        if not exact:
+            snapshot = read_snapshot(QUICK_STATS_SNAPSHOT, QUICK_STATS_SNAPSHOT_TTL)
+            if snapshot is not None:
+                return {'ok': True, 'stats': snapshot, 'cached': True}
+
         try:
             if not self.connection or self.connection.closed:
                 if not self.connect():
                     return {'ok': False, 'message': 'Falha ao conectar'}
 
-            stats = {}
-            # Total de linhas
-            self.cursor.execute(f"SELECT COUNT(*) AS c FROM {TABLE_NAME}")
-            stats['total'] = int(self.cursor.fetchone()['c'])
-
-            # Apenas na ordem
-            self.cursor.execute(f"SELECT COUNT(*) AS c FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE")
-            stats['total_na_ordem'] = int(self.cursor.fetchone()['c'])
-
-            # Min/Max de valor considerando apenas registros válidos e na ordem
+            # Uma única ida ao banco: total estimado (reltuples), contagem na ordem,
+            # min/max de valor e amostra de 5 registros (id, ordem, valor) na ordem.
+            # Contagem na ordem: reltuples do índice parcial idx_precatorios_esta_na_ordem
+            # (uma entrada por registro na ordem); COUNT(*) só se o índice nunca foi analisado
+            # Com `exact`, as duas contagens saem de uma só varredura (COUNT ... FILTER)
+            count_na_ordem = f"(SELECT COUNT(*) FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE)"
+            if exact:
+                counts_cte = (
+                    "WITH contagem AS (SELECT COUNT(*) AS total, "
+                    f"COUNT(*) FILTER (WHERE esta_na_ordem = TRUE) AS total_na_ordem FROM {TABLE_NAME}) "
+                )
+                total = "(SELECT total FROM contagem)"
+                total_na_ordem = "(SELECT total_na_ordem FROM contagem)"
+                params = []
+            else:
+                counts_cte = ""
+                total = "(SELECT reltuples::bigint FROM pg_class WHERE relname = %s)"
+                total_na_ordem = (
+                    "COALESCE((SELECT NULLIF(reltuples, -1)::bigint FROM pg_class "
+                    f"WHERE relname = '{IN_ORDEM_INDEX_NAME}'), {count_na_ordem})"
+                )
+                params = [TABLE_NAME]
+            # MIN/MAX em subconsultas separadas: cada uma vira uma leitura de ponta de índice
             self.cursor.execute(
-                f"SELECT MIN(valor) AS min_valor, MAX(valor) AS max_valor FROM {TABLE_NAME} WHERE valor IS NOT NULL AND esta_na_ordem = TRUE"
+                f"""
+                {counts_cte}
+                SELECT
+                    {total} AS total,
+                    {total_na_ordem} AS total_na_ordem,
+                    (SELECT MIN(valor) FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE) AS min_valor,
+                    (SELECT MAX(valor) FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE) AS max_valor,
+                    (
+                        SELECT json_agg(amostra)
+                        FROM (
+                            SELECT id, ordem, valor
+                            FROM {TABLE_NAME}
+                            WHERE esta_na_ordem = TRUE
+                            ORDER BY ordem
+                            LIMIT 5
+                        ) amostra
+                    ) AS sample
+                """,
+                params
             )
             row = self.cursor.fetchone()
-            stats['min_valor'] = float(row['min_valor']) if row and row['min_valor'] is not None else None
-            stats['max_valor'] = float(row['max_valor']) if row and row['max_valor'] is not None else None
 
-            # Amostra de 5 registros (id, ordem, valor) na ordem
-            self.cursor.execute(
-                f"SELECT id, ordem, valor FROM {TABLE_NAME} WHERE esta_na_ordem = TRUE ORDER BY ordem LIMIT 5"
-            )
-            stats['sample'] = [dict(r) for r in self.cursor.fetchall()]
+            stats = {
+                'total': int(row['total']) if row['total'] is not None else None,
+                'total_na_ordem': int(row['total_na_ordem']),
+                'min_valor': float(row['min_valor']) if row['min_valor'] is not None else None,
+                'max_valor': float(row['max_valor']) if row['max_valor'] is not None else None,
+                'sample': row['sample'] or [],
+                'total_is_estimate': not exact,
+                'total_na_ordem_is_estimate': not exact,
+            }
+            stats['generated_at'] = get_brazil_time().isoformat()
+
+            # Mesmo MAX(valor) dos registros na ordem que get_cached_max_valor consulta:
+            # aproveitar para renovar aquele cache sem outra ida ao banco
+            if stats['max_valor']:
+                store_cached_max_valor(stats['max_valor'])
 
+            write_snapshot(QUICK_STATS_SNAPSHOT, stats)
             return {'ok': True, 'stats': stats}
         except Exception as e:
             logger.error(f"Erro em quick stats: {e}")
@@ -786,12 +1753,13 @@ class DatabaseManager:
     def get_max_value(self, field: str) -> float:
         """Obtém rapidamente o maior valor usando índice (ORDER BY DESC LIMIT 1)."""
         try:
-            # Estratégia mais rápida que agregação MAX() em tabelas grandes
+            # Estratégia mais rápida que agregação MAX() em tabelas grandes; NULLS LAST casa
+            # com a ordenação do índice parcial idx_precs_ord_valor_desc
             query = f"""
                 SELECT {field} AS max_valor
                 FROM {TABLE_NAME}
                 WHERE {field} IS NOT NULL AND esta_na_ordem = TRUE
-                ORDER BY {field} DESC
+                ORDER BY {field} DESC NULLS LAST
                 LIMIT 1
             """
             self.cursor.execute(query)
@@ -806,57 +1774,92 @@ class DatabaseManager:
 
     def get_log_filter_values(self, field: str) -> List[str]:
         """Obtém valores únicos para filtros de logs"""
+        return self.get_log_filter_values_batch([field]).get(field, [])
+
+    def get_log_filter_values_batch(self, fields: List[str]) -> Dict[str, List[str]]:
+        """Valores únicos de vários filtros de logs em uma única ida ao banco.
+
+        GROUPING SETS agrupa cada coluna separadamente em uma só varredura de precatorios_logs;
+        GROUPING(...) indica a qual coluna pertence cada linha.
+        """
+        columns = [field for field in fields if field in LOG_FILTER_FIELDS]
+        values_by_field = {field: [] for field in fields}
+        if not columns:
+            return values_by_field
         try:
             if not self.connection or self.connection.closed:
                 if not self.connect():
-                    return []
-            
-            # Mapear campos para colunas da tabela
-            field_mapping = {
-                'organizacao': 'l.organizacao',
-                'prioridade': 'l.prioridade', 
-                'tribunal': 'l.tribunal',
-                'campo_modificado': 'l.campo_modificado',
-                'precatorio': 'l.precatorio'
-            }
+                    return values_by_field
             
-            if field not in field_mapping:
-                return []
-            
-            column = field_mapping[field]
+            select_columns = ", ".join(f"l.{column}" for column in columns)
+            grouping_sets = ", ".join(f"(l.{column})" for column in columns)
             query = f"""
-                SELECT DISTINCT {column} as value
+                SELECT {select_columns}, GROUPING({select_columns}) AS grupo
                 FROM precatorios_logs l
-                WHERE {column} IS NOT NULL AND {column} != ''
-                ORDER BY {column}
+                GROUP BY GROUPING SETS ({grouping_sets})
             """
+            # Bit de GROUPING: 0 para a coluna agrupada no conjunto (a primeira é o bit mais alto)
+            all_bits = (1 << len(columns)) - 1
+            field_by_mask = {all_bits & ~(1 << (len(columns) - 1 - i)): column for i, column in enumerate(columns)}
             
-            self.cursor.execute(query)
-            results = self.cursor.fetchall()
-            
-            values = []
-            for row in results:
-                if isinstance(row, dict):
-                    value = row['value']
-                else:
-                    value = row[0]
-                
-                if value and str(value).strip():
-                    values.append(str(value).strip())
+            # GROUP BY (HashAggregate em memória) em vez de DISTINCT (Sort + Unique sobre todos os logs)
+            self.cursor.execute(FILTER_VALUES_WORK_MEM_SETTING + query)
+            for row in self.cursor.fetchall():
+                field = field_by_mask.get(row['grupo'])
+                if field is None:
+                    continue
+                value = row[field]
+                if value is not None and str(value).strip():
+                    values_by_field[field].append(str(value).strip())
             
-            return sorted(values)
+            for field in columns:
+                values_by_field[field].sort()
+            return values_by_field
             
         except psycopg2.Error as e:
-            logger.error(f"Erro ao buscar valores únicos para {field}: {e}")
+            logger.error(f"Erro ao buscar valores únicos para {columns}: {e}")
             if self.connection:
                 self.connection.rollback()
-            return []
+            return {field: [] for field in fields}
         except Exception as e:
-            logger.error(f"Erro inesperado ao buscar valores únicos para {field}: {e}")
-            return []
+            logger.error(f"Erro inesperado ao buscar valores únicos para {columns}: {e}")
+            return {field: [] for field in fields}
 
-    def get_logs_paginated(self, page: int = 1, per_page: int = 50, filters: Dict[str, str] = None) -> Dict[str, Any]:
-        """Obtém logs de alterações com paginação e filtros"""
+    def estimate_table_rows(self, table_name: str) -> int:
+        """Número aproximado de linhas via pg_class.reltuples (sem varrer a tabela, cache de 5 minutos)"""
+        cached = _table_rows_estimates.get(table_name)
+        if cached is not None and time.monotonic() - cached[0] < TABLE_ROWS_ESTIMATE_TTL:
+            return cached[1]
+        try:
+            self.cursor.execute("SELECT reltuples::bigint AS estimate FROM pg_class WHERE relname = %s", [table_name])
+            row = self.cursor.fetchone()
+            estimate = max(int(row['estimate']), 0) if row and row['estimate'] is not None else 0
+            # reltuples só muda com VACUUM/ANALYZE: reaproveitar entre requisições
+            _table_rows_estimates[table_name] = (time.monotonic(), estimate)
+            return estimate
+        except psycopg2.Error as e:
+            logger.warning(f"Erro ao estimar linhas de {table_name}: {e}")
+            return 0
+
+    def estimate_query_rows(self, query: str, params: List[Any] = None) -> int:
+        """Número aproximado de linhas de uma consulta via EXPLAIN (custo de planejamento apenas)"""
+        try:
+            self.cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params or [])
+            row = self.cursor.fetchone()
+            plan = row['QUERY PLAN'] if isinstance(row, dict) else row[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except (psycopg2.Error, KeyError, IndexError, TypeError, ValueError) as e:
+            logger.warning(f"Erro ao estimar linhas da consulta: {e}")
+            return 0
+
+    def get_logs_paginated(self, page: int = 1, per_page: int = 50, filters: Dict[str, str] = None, cursor_after: Optional[Tuple[datetime, int]] = None) -> Dict[str, Any]:
+        """Obtém logs de alterações com paginação e filtros.
+
+        Com `cursor_after` = (data_modificacao, id) do último registro da página anterior,
+        usa paginação por chave (seek) em vez de OFFSET: custo O(per_page) em qualquer página.
+        """
         try:
             logger.info(f"Buscando logs - Página: {page}, Por página: {per_page}, Filtros: {filters}")
             
@@ -873,7 +1876,6 @@ class DatabaseManager:
                        l.precatorio, l.ordem
                 FROM precatorios_logs l
             """
-            count_query = "SELECT COUNT(*) FROM precatorios_logs l"
 
             # Adicionar filtros
             where_conditions = []
@@ -887,35 +1889,62 @@ class DatabaseManager:
                         where_conditions.append(f"l.{field} = %s")
                         params.append(filters[field])
 
-                # Campos com correspondência parcial (datas)
+                # Intervalo de datas semiaberto sobre a coluna "nua" (sem DATE()), para que o
+                # índice idx_precatorios_logs_data_id_desc seja usado: [data_inicio, data_fim + 1 dia)
                 if filters.get('data_inicio'):
-                    where_conditions.append("DATE(l.data_modificacao) >= %s")
+                    where_conditions.append("l.data_modificacao >= %s::date")
                     params.append(filters['data_inicio'])
 
                 if filters.get('data_fim'):
-                    where_conditions.append("DATE(l.data_modificacao) <= %s")
+                    where_conditions.append("l.data_modificacao < %s::date + INTERVAL '1 day'")
                     params.append(filters['data_fim'])
 
+            where_clause = ""
             if where_conditions:
                 where_clause = " WHERE " + " AND ".join(where_conditions)
-                base_query += where_clause
-                count_query += where_clause
 
-            # Adicionar ordenação (mais recentes primeiro)
-            base_query += " ORDER BY l.data_modificacao DESC"
+            # Cursor de paginação fica fora de where_clause (que também alimenta a estimativa do total)
+            page_conditions = list(where_conditions)
+            page_params = list(params)
+            if cursor_after is not None:
+                page_conditions.append("(l.data_modificacao, l.id) < (%s, %s)")
+                page_params.extend(cursor_after)
+            if page_conditions:
+                base_query += " WHERE " + " AND ".join(page_conditions)
+
+            # Adicionar ordenação (mais recentes primeiro); id desempata registros do mesmo instante
+            base_query += " ORDER BY l.data_modificacao DESC, l.id DESC"
 
-            # Adicionar paginação
+            # Adicionar paginação (sem OFFSET quando há cursor); como parâmetros, para que o
+            # formato da consulta (e o statement preparado) seja o mesmo em todas as páginas
             offset = (page - 1) * per_page
-            base_query += f" LIMIT {per_page} OFFSET {offset}"
+            if cursor_after is not None:
+                base_query += " LIMIT %s"
+                page_params.append(per_page)
+            else:
+                base_query += " LIMIT %s OFFSET %s"
+                page_params.extend([per_page, offset])
 
-            # Executar contagem
-            self.cursor.execute(count_query, params)
-            count_result = self.cursor.fetchone()
-            total_count = count_result['count'] if isinstance(count_result, dict) else count_result[0]
+            # Páginas grandes (exportação) vêm em lotes por cursor server-side, sem materializar
+            # o resultado inteiro no cliente; as demais: PREPARE na primeira vez por formato nesta conexão
+            if per_page > SERVER_SIDE_CURSOR_THRESHOLD:
+                data = self.fetch_dicts_server_side(base_query, page_params)
+            else:
+                self.execute_prepared(self.cursor, base_query, page_params)
+                # RealDictRow já é um dict: sem cópia por linha
+                data = self.cursor.fetchall()
 
-            # Executar query principal
-            self.cursor.execute(base_query, params)
-            data = self.cursor.fetchall()
+            # Total sem COUNT(*) e, quando possível, sem segunda ida ao banco:
+            # página incompleta já fornece o total exato; página cheia usa reltuples (sem
+            # filtros) ou a estimativa do planner (com filtros), implicando próxima página
+            if len(data) < per_page:
+                total_count = offset + len(data)
+            else:
+                if where_conditions:
+                    total_count = self.estimate_query_rows(f"SELECT 1 FROM precatorios_logs l{where_clause}", params)
+                else:
+                    total_count = self.estimate_table_rows('precatorios_logs')
+                total_count = max(total_count, offset + len(data) + 1)
 
             logger.info(f"Query executada com sucesso. Total no banco: {total_count}, Retornados: {len(data)}")
 
@@ -931,11 +1960,14 @@ class DatabaseManager:
                 'has_prev': page > 1,
                 'has_next': page < total_pages,
                 'prev_num': page - 1 if page > 1 else None,
-                'next_num': page + 1 if page < total_pages else None
+                'next_num': page + 1 if page < total_pages else None,
+                'total_is_estimate': len(data) == per_page,
+                # Cursor para a próxima página (paginação por chave)
+                'next_cursor': encode_logs_cursor(data[-1]) if len(data) == per_page else None
             }
 
             return {
-                'data': [dict(row) for row in data],
+                'data': data,
                 'pagination': pagination
             }
 
@@ -959,27 +1991,33 @@ class DatabaseManager:
     def log_precatorio_change(self, precatorio_id: str, field: str, old_value: Any, new_value: Any, 
                               organizacao: str, prioridade: str, tribunal: str, precatorio: str, ordem: int) -> bool:
         """Registra uma alteração na tabela de logs"""
+        return self.log_precatorio_changes([
+            build_log_row(field, old_value, new_value, get_brazil_time().replace(tzinfo=None),
+                          organizacao, prioridade, tribunal, precatorio, ordem)
+        ])
+
+    def log_precatorio_changes(self, log_rows: List[tuple]) -> bool:
+        """Registra várias alterações (linhas de build_log_row).
+
+        Lotes pequenos usam um INSERT multi-VALUES; lotes grandes (edição em massa) usam COPY.
+        """
+        if not log_rows:
+            return True
         try:
-            log_query = """
-                INSERT INTO precatorios_logs 
-                (organizacao, prioridade, tribunal, campo_modificado, valor_anterior, valor_novo, 
-                 data_modificacao, precatorio, ordem)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            log_values = [
-                organizacao,
-                prioridade,
-                tribunal,
-                field,
-                str(old_value) if old_value is not None else None,
-                str(new_value) if new_value is not None else None,
-                get_brazil_time().replace(tzinfo=None),
-                precatorio,
-                ordem
-            ]
-            
-            self.cursor.execute(log_query, log_values)
+            if len(log_rows) >= LOG_COPY_THRESHOLD:
+                buffer = io.StringIO()
+                writer = csv.writer(buffer, lineterminator='\n')
+                writer.writerows(
+                    tuple(LOG_COPY_NULL if v is None else v for v in row) for row in log_rows
+                )
+                buffer.seek(0)
+                self.cursor.copy_expert(
+                    f"COPY precatorios_logs ({LOG_COLUMNS_SQL}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')",
+                    buffer
+                )
+                return True
+            log_query = f"INSERT INTO precatorios_logs ({LOG_COLUMNS_SQL}) VALUES %s"
+            execute_values(self.cursor, log_query, log_rows, page_size=LOG_INSERT_PAGE_SIZE)
             return True
             
         except psycopg2.Error as e:
@@ -987,153 +2025,109 @@ class DatabaseManager:
             return False
 
     def bulk_update_precatorios(self, updates_data: List[Dict[str, Any]]) -> Dict[str, int]:
-        """Atualização em massa usando uma única query SQL - muito mais rápida"""
+        """Atualização em massa usando uma única query SQL - muito mais rápida.
+
+        `updates_data`: [{'id': ..., 'updates': {campo: valor}}]. Os valores anteriores (para os
+        logs) voltam do próprio UPDATE, sem SELECT prévio.
+        """
         try:
             if not updates_data:
                 return {'success_count': 0, 'error_count': 0}
             
-            # Preparar dados para atualização em massa
-            update_fields = []
-            case_statements = {}
-            ids = []
-            
-            # Obter campos que serão atualizados
-            first_update = updates_data[0]
-            for field, value in first_update['updates'].items():
-                if field != 'id':
-                    update_fields.append(field)
-                    case_statements[field] = f"CASE id "
+            # Campos a atualizar (apenas colunas conhecidas: o nome vai direto no SQL)
+            # Ordenados: o mesmo conjunto de campos gera sempre o mesmo texto de SQL
+            update_fields = sorted(field for field in updates_data[0]['updates']
+                                   if field in BULK_UPDATABLE_FIELDS)
             
-            # Construir CASE statements para cada campo
+            # Uma linha (id, valores tipados..., data_atualizacao) por registro; None mantém o valor
+            # atual (COALESCE), como o antigo ELSE do CASE. Valores vão como parâmetros (sem escape manual)
+            current_time = get_brazil_time().replace(tzinfo=None)
+            rows = []
+            updates_by_id = {}
+            # A edição em massa aplica o mesmo dicionário de alterações a todas as linhas:
+            # converter cada dicionário distinto uma única vez (chave id(), objetos vivos em updates_data)
+            converted_by_updates = {}
             for update_data in updates_data:
-                precatorio_id = update_data['id']
                 updates = update_data['updates']
-                ids.append(str(precatorio_id))
-                
-                for field in update_fields:
-                    value = updates.get(field)
-                    if value is not None:
-                        # Formatar valor conforme tipo de campo
-                        if field in ('ordem', 'ano_orc'):
-                            # Campos integer
-                            try:
-                                int_value = int(value) if value is not None else None
-                                if int_value is not None:
-                                    case_statements[field] += f"WHEN {precatorio_id} THEN {int_value} "
-                            except (ValueError, TypeError):
-                                # Se não conseguir converter, mantém valor atual (ELSE field)
-                                pass
-                        elif field == 'valor':
-                            # Campo numeric
-                            try:
-                                if isinstance(value, str):
-                                    normalized_val = value.replace('R$', '').replace(' ', '').replace(',', '.')
-                                    normalized_val = re.sub(r"[^0-9.]", "", normalized_val)
-                                    if normalized_val:
-                                        float_value = float(normalized_val)
-                                        case_statements[field] += f"WHEN {precatorio_id} THEN {float_value} "
-                                else:
-                                    float_value = float(value)
-                                    case_statements[field] += f"WHEN {precatorio_id} THEN {float_value} "
-                            except (ValueError, TypeError):
-                                pass
-                        elif field in ('esta_na_ordem', 'nao_esta_na_ordem', 'presenca_no_pipe'):
-                            # Campos boolean - PostgreSQL usa TRUE/FALSE sem aspas
-                            if isinstance(value, str):
-                                bool_value = value.lower() in ('true', '1', 'sim', 's', 'yes', 'y')
-                            else:
-                                bool_value = bool(value)
-                            bool_str = 'TRUE' if bool_value else 'FALSE'
-                            case_statements[field] += f"WHEN {precatorio_id} THEN {bool_str} "
-                        elif field == 'data_base' and isinstance(value, (date, datetime)):
-                            # Campo data
-                            if isinstance(value, datetime):
-                                date_value = value.date()
-                            else:
-                                date_value = value
-                            case_statements[field] += f"WHEN {precatorio_id} THEN '{date_value}'::date "
-                        else:
-                            # Campos texto - escapar aspas simples para SQL
-                            escaped_value = str(value).replace("'", "''")
-                            case_statements[field] += f"WHEN {precatorio_id} THEN '{escaped_value}' "
-            
-            # Finalizar CASE statements
-            for field in update_fields:
-                case_statements[field] += "ELSE " + field + " END"
-            
-            # Adicionar timestamp de atualização
-            current_time = get_brazil_time().replace(tzinfo=None)
-            case_statements['data_atualizacao'] = f"CASE id "
-            for precatorio_id in ids:
-                case_statements['data_atualizacao'] += f"WHEN {precatorio_id} THEN '{current_time}' "
-            case_statements['data_atualizacao'] += "ELSE data_atualizacao END"
-            
-            # Construir query de atualização em massa
-            set_clauses = []
-            for field in update_fields + ['data_atualizacao']:
-                set_clauses.append(f"{field} = {case_statements[field]}")
+                precatorio_id = int(update_data['id'])
+                updates_by_id[precatorio_id] = updates
+                converted = converted_by_updates.get(id(updates))
+                if converted is None:
+                    converted = tuple(bulk_update_value(field, updates.get(field)) for field in update_fields)
+                    converted_by_updates[id(updates)] = converted
+                rows.append((precatorio_id,) + converted + (current_time,))
             
-            ids_str = ','.join(ids)
-            query = f"""
-                UPDATE {TABLE_NAME}
-                SET {', '.join(set_clauses)}
-                WHERE id IN ({ids_str})
-            """
-            
-            logger.info(f"Executando atualização em massa para {len(ids)} registros")
-            self.cursor.execute(query)
+            # UPDATE ... FROM (VALUES ...): um comando parametrizado, sem CASE crescendo com N.
+            # A CTE "anterior" lê as linhas no snapshot do comando (antes do UPDATE) e o JOIN com
+            # o RETURNING devolve só as que foram de fato atualizadas
+            set_clauses = [f"{field} = COALESCE(v.{field}, t.{field})" for field in update_fields]
+            set_clauses.append("data_atualizacao = v.data_atualizacao")
+            columns = ['id'] + update_fields + ['data_atualizacao']
+            casts = ['bigint'] + [BULK_UPDATE_FIELD_TYPES.get(field, 'text') for field in update_fields] + ['timestamp']
+            # Imagem anterior só com o necessário para os logs: contexto + campos alterados
+            previous_columns = ', '.join(f"t.{field}" for field in dict.fromkeys(LOG_CONTEXT_FIELDS + tuple(update_fields)))
+            query = (
+                f"WITH v({', '.join(columns)}) AS (VALUES %s), "
+                f"anterior AS (SELECT {previous_columns} FROM {TABLE_NAME} AS t JOIN v ON t.id = v.id), "
+                f"atualizado AS (UPDATE {TABLE_NAME} AS t SET {', '.join(set_clauses)} "
+                f"FROM v WHERE t.id = v.id RETURNING t.id) "
+                f"SELECT anterior.* FROM anterior JOIN atualizado USING (id)"
+            )
+            template = "(" + ", ".join(f"%s::{cast}" for cast in casts) + ")"
             
-            # Registrar logs para cada alteração
-            for update_data in updates_data:
-                precatorio_id = update_data['id']
-                updates = update_data['updates']
-                current_data = update_data.get('current_data', {})
+            logger.info(f"Executando atualização em massa para {len(rows)} registros")
+            # UPDATE e logs na mesma transação
+            with self.transaction():
+                previous_rows = execute_values(self.cursor, query, rows, template=template,
+                                               page_size=BULK_UPDATE_PAGE_SIZE, fetch=True)
                 
-                for field, new_value in updates.items():
-                    if field != 'id':
-                        old_value = current_data.get(field)
-                        if old_value != new_value:
-                            self.log_precatorio_change(
-                                precatorio_id=str(precatorio_id),
-                                field=field,
-                                old_value=old_value,
-                                new_value=new_value,
-                                organizacao=current_data.get('organizacao', ''),
-                                prioridade=current_data.get('prioridade', ''),
-                                tribunal=current_data.get('tribunal', ''),
-                                precatorio=current_data.get('precatorio', ''),
-                                ordem=current_data.get('ordem', 0)
-                            )
-            
-            self.connection.commit()
+                # Registrar logs para cada alteração (acumulados e inseridos de uma vez)
+                log_rows = []
+                for current_data in previous_rows:
+                    updates = updates_by_id.get(int(current_data['id']), {})
+                    
+                    for field, new_value in updates.items():
+                        if field in update_fields:
+                            old_value = current_data.get(field)
+                            if old_value != new_value:
+                                log_rows.append(build_log_row(
+                                    field, old_value, new_value, current_time,
+                                    current_data.get('organizacao', ''),
+                                    current_data.get('prioridade', ''),
+                                    current_data.get('tribunal', ''),
+                                    current_data.get('precatorio', ''),
+                                    current_data.get('ordem', 0)
+                                ))
+                # Falha no log aborta a transação: o COMMIT viraria um ROLLBACK silencioso
+                if not self.log_precatorio_changes(log_rows):
+                    raise psycopg2.DatabaseError("Falha ao registrar log da atualização em massa")
             
-            logger.info(f"Atualização em massa concluída: {len(ids)} registros")
-            return {'success_count': len(ids), 'error_count': 0}
+            # IDs inexistentes são ignorados, como no SELECT prévio de antes
+            if len(previous_rows) < len(rows):
+                logger.warning(f"{len(rows) - len(previous_rows)} IDs não encontrados na atualização em massa")
+            logger.info(f"Atualização em massa concluída: {len(previous_rows)} registros")
+            return {'success_count': len(previous_rows), 'error_count': 0}
             
         except psycopg2.Error as e:
             logger.error(f"Erro na atualização em massa: {e}")
-            if self.connection:
-                self.connection.rollback()
             return {'success_count': 0, 'error_count': len(updates_data)}
 
     def update_precatorio(self, precatorio_id: str, updates: Dict[str, Any],
                           usuario: str = 'Sistema Web', ip_address: str = None, user_agent: str = None) -> bool:
         """Atualiza um precatório específico - otimizado para Vercel"""
         try:
-            # Primeiro, buscar dados atuais para comparação
-            current_query = f"SELECT organizacao, prioridade, tribunal, precatorio, ordem, {', '.join(updates.keys())} FROM {TABLE_NAME} WHERE id = %s"
-            self.cursor.execute(current_query, [precatorio_id])
-            current_data = self.cursor.fetchone()
-            
-            if not current_data:
-                logger.error(f"Precatório ID {precatorio_id} não encontrado")
-                return False
+            # Apenas colunas conhecidas (o nome vai direto no SQL)
+            unknown_fields = [field for field in updates if field != 'id' and field not in PRECATORIO_LIST_FIELDS]
+            if unknown_fields:
+                logger.warning(f"Campos ignorados na atualização de {precatorio_id}: {unknown_fields}")
+                updates = {field: value for field, value in updates.items() if field not in unknown_fields}
             
             # Preparar campos e valores para atualização
             fields = []
             values = []
 
-            for field, value in updates.items():
+            # Ordem canônica dos campos: um texto de SQL por conjunto de campos
+            for field, value in sorted(updates.items()):
                 if field != 'id':  # Não atualizar a chave primária
                     fields.append(f"{field} = %s")
                     values.append(value)
@@ -1142,48 +2136,60 @@ class DatabaseManager:
                 return False
 
             # Adicionar timestamp de atualização
+            current_time = get_brazil_time().replace(tzinfo=None)
             fields.append("data_atualizacao = %s")
-            values.append(get_brazil_time().replace(tzinfo=None))
-
-            # Adicionar ID do precatório para WHERE
-            values.append(precatorio_id)
+            values.append(current_time)
 
+            # Uma ida ao banco: a CTE "anterior" lê a linha no snapshot do comando (valores antes
+            # do UPDATE) e o UPDATE ... RETURNING confirma que ela existia; sem SELECT separado
             query = f"""
-                UPDATE {TABLE_NAME}
-                SET {', '.join(fields)}
-                WHERE id = %s
+                WITH anterior AS (
+                    SELECT {', '.join(PRECATORIO_LIST_FIELDS)} FROM {TABLE_NAME} WHERE id = %s
+                ), atualizado AS (
+                    UPDATE {TABLE_NAME}
+                    SET {', '.join(fields)}
+                    WHERE id = %s
+                    RETURNING id
+                )
+                SELECT anterior.* FROM anterior JOIN atualizado USING (id)
             """
 
-            self.cursor.execute(query, values)
-            
-            # Registrar logs para cada campo alterado
-            for field, new_value in updates.items():
-                if field != 'id':
-                    old_value = current_data.get(field)
-                    if old_value != new_value:  # Só registrar se houve mudança
-                        self.log_precatorio_change(
-                            precatorio_id=precatorio_id,
-                            field=field,
-                            old_value=old_value,
-                            new_value=new_value,
-                            organizacao=current_data.get('organizacao', ''),
-                            prioridade=current_data.get('prioridade', ''),
-                            tribunal=current_data.get('tribunal', ''),
-                            precatorio=current_data.get('precatorio', ''),
-                            ordem=current_data.get('ordem', 0)
-                        )
-            
-            self.connection.commit()
+            with self.transaction():
+                self.cursor.execute(query, [precatorio_id] + values + [precatorio_id])
+                current_data = self.cursor.fetchone()
+                
+                if not current_data:
+                    logger.error(f"Precatório ID {precatorio_id} não encontrado")
+                    return False
+                
+                # Registrar logs para cada campo alterado (um único INSERT, na mesma transação)
+                log_rows = []
+                for field, new_value in updates.items():
+                    if field != 'id':
+                        old_value = current_data.get(field)
+                        if old_value != new_value:  # Só registrar se houve mudança
+                            log_rows.append(build_log_row(
+                                field, old_value, new_value, current_time,
+                                current_data.get('organizacao', ''),
+                                current_data.get('prioridade', ''),
+                                current_data.get('tribunal', ''),
+                                current_data.get('precatorio', ''),
+                                current_data.get('ordem', 0)
+                            ))
+                # Falha no log aborta a transação: o COMMIT viraria um ROLLBACK silencioso
+                if not self.log_precatorio_changes(log_rows):
+                    raise psycopg2.DatabaseError(f"Falha ao registrar log do precatório {precatorio_id}")
 
             logger.info(f"Precatório ID {precatorio_id} atualizado com sucesso")
             return True
 
         except psycopg2.Error as e:
             logger.error(f"Erro ao atualizar precatório {precatorio_id}: {e}")
-            if self.connection:
-                self.connection.rollback()
             return False
 
+# Compilado uma vez: normalize_text roda para cada chave do CSV de tetos e cada organização buscada
+_NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
 # Função para ler o CSV e criar dicionário de teto de repasse por município
 def normalize_text(text: str) -> str:
     """Remove acentos, espaços e caracteres especiais para comparação."""
@@ -1192,7 +2198,7 @@ def normalize_text(text: str) -> str:
     text = unicodedata.normalize('NFKD', text)
     text = ''.join(char for char in text if not unicodedata.combining(char))
     text = text.lower()
-    text = re.sub(r'[^a-z0-9]+', '', text)
+    text = _NON_ALNUM_RE.sub('', text)
     return text
 
 
@@ -1476,18 +2482,18 @@ def calculate_accumulative_by_municipio(db_manager, municipio=None):
 
 # Cache para dicionário de tetos (carregado uma vez)
 _cached_teto_dict = None
-_teto_cache_timestamp = None
+_teto_cache_timestamp = None  # time.monotonic() da última carga
+TETO_CACHE_TTL = 3600.0  # Cache de 1 hora
 
 def get_teto_dict():
     """Retorna o dicionário de tetos com cache"""
     global _cached_teto_dict, _teto_cache_timestamp
-    from datetime import datetime, timedelta
     
-    now = datetime.now()
+    now = time.monotonic()
     cache_valid = (
         _cached_teto_dict is not None and
         _teto_cache_timestamp is not None and
-        (now - _teto_cache_timestamp) < timedelta(hours=1)  # Cache de 1 hora
+        (now - _teto_cache_timestamp) < TETO_CACHE_TTL
     )
     
     if not cache_valid:
@@ -1535,7 +2541,6 @@ def calculate_pec66_for_records(records):
             acumulativo_float = float(acumulativo) if acumulativo is not None else 0.0
         except (TypeError, ValueError):
             try:
-                from decimal import Decimal
                 acumulativo_float = float(Decimal(str(acumulativo))) if acumulativo is not None else 0.0
             except Exception:
                 if idx < 3:
@@ -1673,10 +2678,13 @@ def calculate_pec66_for_records(records):
     return records
 
 
-def enrich_records_with_pec66(records: List[Dict[str, Any]], db_manager: 'DatabaseManager') -> List[Dict[str, Any]]:
+def enrich_records_with_pec66(records: List[Dict[str, Any]], db_manager: 'DatabaseManager',
+                              acumulativo_cache: Optional[Dict[str, Dict[int, float]]] = None) -> List[Dict[str, Any]]:
     """
     Popula os campos relacionados ao PEC 66 (acumulativo, meses e CAPREC).
     Versão simplificada: calcula acumulativo diretamente no SQL para cada organização.
+    `acumulativo_cache` ({organização: {ordem: acumulativo}}) reaproveita o cálculo entre
+    chamadas sucessivas (exportação em lotes).
     """
     if not records:
         return records
@@ -1716,6 +2724,14 @@ def enrich_records_with_pec66(records: List[Dict[str, Any]], db_manager: 'Databa
     try:
         for org, records_org in organizacoes_dict.items():
             try:
+                acumulativo_dict = acumulativo_cache.get(org) if acumulativo_cache is not None else None
+                if acumulativo_dict is not None:
+                    for record in records_org:
+                        ordem = record.get('ordem')
+                        if ordem is not None:
+                            record['acumulativo_pec66'] = acumulativo_dict.get(int(ordem))
+                    continue
+
                 # Verificar se cursor está válido antes de usar
                 if not db_manager.cursor or db_manager.cursor.closed:
                     if db_manager.connection and not db_manager.connection.closed:
@@ -1734,22 +2750,26 @@ def enrich_records_with_pec66(records: List[Dict[str, Any]], db_manager: 'Databa
                     ORDER BY ordem ASC
                 """
                 
-                db_manager.cursor.execute(org_query, (org,))
-                org_rows = db_manager.cursor.fetchall()
+                # Cursor de tuplas: a organização pode ter milhares de linhas e só precisamos
+                # de (ordem, valor) posicionais, sem um dict por linha
+                with db_manager.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as org_cursor:
+                    org_cursor.execute(org_query, (org,))
+                    org_rows = org_cursor.fetchall()
                 
                 # Calcular acumulativo progressivo
                 acumulativo = 0.0
                 acumulativo_dict = {}
-                for row in org_rows:
-                    ordem = row.get('ordem')
-                    valor = row.get('valor')
+                for ordem, valor in org_rows:
                     if ordem is not None and valor is not None:
                         try:
-                            valor_float = float(valor) if isinstance(valor, (int, float)) else float(str(valor).replace(',', '.'))
+                            # numeric chega como Decimal: float() direto, sem passar por str
+                            valor_float = float(valor.replace(',', '.')) if isinstance(valor, str) else float(valor)
                             acumulativo += valor_float
                             acumulativo_dict[int(ordem)] = acumulativo
                         except (ValueError, TypeError):
                             pass
+                if acumulativo_cache is not None:
+                    acumulativo_cache[org] = acumulativo_dict
                 
                 # Atribuir acumulativos aos registros da página atual
                 for record in records_org:
@@ -1773,9 +2793,7 @@ def enrich_records_with_pec66(records: List[Dict[str, Any]], db_manager: 'Databa
             return records  # Retornar registros sem cálculos se falhar
 
     except Exception as e:
-        logger.error(f"Erro ao enriquecer registros com PEC 66: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erro ao enriquecer registros com PEC 66: {e}")
         # Sempre tentar calcular meses/CAPREC mesmo em caso de erro
         try:
             return calculate_pec66_for_records(records)
@@ -1853,45 +2871,173 @@ def calculate_pec66_results():
 # Instância global do gerenciador de banco
 db_manager = DatabaseManager()
 
-# Variáveis globais para controle de estado
-original_data = {}
-modified_data = {}
+
+def encode_logs_cursor(row: Dict[str, Any]) -> Optional[str]:
+    """Cursor opaco de paginação dos logs: '<data_modificacao ISO>_<id>'"""
+    if row.get('data_modificacao') is None:
+        return None
+    return f"{row['data_modificacao'].isoformat()}_{row['id']}"
+
+def decode_logs_cursor(value: str) -> Optional[Tuple[datetime, int]]:
+    """Inverso de encode_logs_cursor (None se inválido: cai no OFFSET por página)"""
+    try:
+        timestamp, _, log_id = value.rpartition('_')
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+# Cache das estimativas pg_class.reltuples: {tabela: (time.monotonic(), linhas)}
+_table_rows_estimates = {}
+TABLE_ROWS_ESTIMATE_TTL = 300.0
 
 # Cache para valor máximo (atualizado a cada 5 minutos)
 _cached_max_valor = None
-_cache_timestamp = None
-
-# Cache para valores de filtro (atualizado a cada 30 minutos para melhor performance)
-_filter_values_cache = {}
-_filter_cache_timestamp = {}
+_cache_timestamp = None  # time.monotonic() da última atualização
+MAX_VALOR_CACHE_TTL = 300.0
+
+# Cache para valores de filtro: {(campo, filtros ativos): (time.monotonic(), tupla de valores)}
+# LRU limitado (os filtros ativos vêm da query string) e protegido por lock: os dropdowns
+# são carregados em threads (get_filter_values_batch). Entradas expiradas continuam
+# disponíveis como fallback em caso de erro no banco, até serem despejadas
+_filter_values_cache = OrderedDict()
+_filter_values_lock = threading.Lock()
+FILTER_VALUES_CACHE_MAXSIZE = 512
+# Campos pequenos que podem ser consultados juntos (get_all_filter_values)
+FILTER_VALUES_FUSABLE_FIELDS = ('prioridade', 'tribunal', 'natureza', 'regime', 'situacao', 'ano_orc')
+FILTER_VALUES_TTL = 3600  # 1 hora
+FILTER_VALUES_EMPTY_TTL = 300  # resultados vazios (negative caching) expiram antes
+FILTER_VALUES_FILTERED_TTL = 60  # dropdowns dependentes (filtros ativos): combinações mais voláteis
+
+def filter_values_cache_key(field: str, active_filters: Optional[Dict[str, Any]]) -> tuple:
+    """Chave hashable e independente de ordem para (campo, filtros ativos)"""
+    if not active_filters:
+        return (field, ())
+    items = tuple(sorted(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in active_filters.items() if value
+    ))
+    return (field, items)
+
+def get_cached_filter_values(cache_key: tuple, allow_stale: bool = False) -> Optional[tuple]:
+    """Retorna os valores cacheados se ainda válidos (ou qualquer idade, com allow_stale), senão None"""
+    with _filter_values_lock:
+        entry = _filter_values_cache.get(cache_key)
+        if entry is None:
+            return None
+        _filter_values_cache.move_to_end(cache_key)
+    cached_at, values = entry
+    if allow_stale:
+        return values
+    ttl = FILTER_VALUES_TTL if values else FILTER_VALUES_EMPTY_TTL
+    if cache_key[1]:
+        # Com filtros ativos: TTL curto (gravações de outras instâncias não invalidam este cache)
+        ttl = min(ttl, FILTER_VALUES_FILTERED_TTL)
+    return values if time.monotonic() - cached_at < ttl else None
+
+def store_filter_values(cache_key: tuple, values: List[str]) -> None:
+    """Guarda os valores (como tupla imutável), despejando os menos usados acima do limite"""
+    with _filter_values_lock:
+        _filter_values_cache[cache_key] = (time.monotonic(), tuple(values))
+        _filter_values_cache.move_to_end(cache_key)
+        while len(_filter_values_cache) > FILTER_VALUES_CACHE_MAXSIZE:
+            _filter_values_cache.popitem(last=False)
+
+def invalidate_filter_values(fields) -> None:
+    """Descarta os valores de dropdown que uma gravação nos campos `fields` pode ter alterado:
+    os do próprio campo e os filtrados por ele (esta_na_ordem afeta todos)"""
+    changed = set(fields)
+    with _filter_values_lock:
+        # A materialized view só reflete a gravação após o próximo REFRESH
+        if 'esta_na_ordem' in changed:
+            _filter_values_mv_stale_fields.update(FILTER_VALUES_MV_FIELDS)
+            _filter_values_cache.clear()
+            return
+        _filter_values_mv_stale_fields.update(changed.intersection(FILTER_VALUES_MV_FIELDS))
+        stale_keys = [
+            key for key in _filter_values_cache
+            if key[0] in changed or any(name in changed for name, _ in key[1])
+        ]
+        for key in stale_keys:
+            del _filter_values_cache[key]
+
+# Materialized view dos dropdowns (FILTER_VALUES_MV): desligada com FILTER_VALUES_MV=0 ou
+# quando ainda não foi criada; campos gravados neste processo desde o último REFRESH
+# voltam à consulta ao vivo
+_filter_values_mv_enabled = os.environ.get('FILTER_VALUES_MV', '1') == '1'
+_filter_values_mv_stale_fields = set()
+
+def filter_values_mv_fields(fields) -> List[str]:
+    """Campos de `fields` que podem ser servidos pela materialized view"""
+    if not _filter_values_mv_enabled:
+        return []
+    with _filter_values_lock:
+        return [field for field in fields
+                if field in FILTER_VALUES_MV_FIELDS and field not in _filter_values_mv_stale_fields]
+
+def mark_filter_values_mv_refreshed() -> None:
+    with _filter_values_lock:
+        _filter_values_mv_stale_fields.clear()
+
+# ETags emitidos por /api/get_filter_options: {query_string: (etag, time.monotonic())}
+# (limitado como o cache de valores: a chave é a query string do cliente)
+_filter_options_etags = OrderedDict()
+FILTER_OPTIONS_MAX_AGE = 300  # segundos
+# Dentro da janela SWR o navegador / Vercel Edge serve a versão anterior enquanto revalida
+FILTER_OPTIONS_CACHE_CONTROL = f'public, max-age={FILTER_OPTIONS_MAX_AGE}, stale-while-revalidate={FILTER_VALUES_TTL}'
+
+# Versão dos dados deste processo, incrementada a cada gravação (/update, /bulk_update).
+# Entra no ETag da página principal junto com um identificador do processo (outra instância
+# nunca valida o ETag desta) e uma janela de tempo que limita o atraso para gravações
+# feitas em outras instâncias
+_data_version = 0
+_data_version_lock = threading.Lock()
+_PROCESS_ETAG_NONCE = os.urandom(4).hex()
+INDEX_ETAG_WINDOW = 60  # segundos
+# Sempre revalidar (If-None-Match) antes de reutilizar a página
+INDEX_CACHE_CONTROL = 'private, no-cache'
+
+def bump_data_version(fields=()) -> None:
+    """Invalida os ETags emitidos por este processo e os dropdowns afetados após uma gravação"""
+    global _data_version
+    with _data_version_lock:
+        _data_version += 1
+        _filter_options_etags.clear()
+    invalidate_filter_values(fields)
+
+def index_etag() -> str:
+    """ETag da página principal: query string + versão dos dados + janela de tempo"""
+    key = f"{_PROCESS_ETAG_NONCE}|{_data_version}|{int(time.time() // INDEX_ETAG_WINDOW)}|"
+    return hashlib.blake2b(key.encode('utf-8') + request.query_string, digest_size=16).hexdigest()
+
+def store_cached_max_valor(valor: float) -> None:
+    """Atualiza o cache do valor máximo (registros na ordem)"""
+    global _cached_max_valor, _cache_timestamp
+    _cached_max_valor = valor
+    _cache_timestamp = time.monotonic()
+    logger.info(f"Valor maximo atualizado no cache: {valor}")
 
 def get_cached_max_valor() -> float:
     """Retorna valor máximo com cache de 5 minutos para performance"""
-    global _cached_max_valor, _cache_timestamp
-    from datetime import datetime, timedelta
-
-    now = datetime.now()
+    now = time.monotonic()
     cache_valid = (
         _cached_max_valor is not None and
         _cache_timestamp is not None and
-        (now - _cache_timestamp) < timedelta(minutes=5)
+        (now - _cache_timestamp) < MAX_VALOR_CACHE_TTL
     )
 
     if cache_valid:
         logger.info(f"Usando valor maximo em cache: {_cached_max_valor}")
         return _cached_max_valor
 
-    # Cache expirado ou vazio - buscar do banco
+    # Cache expirado ou vazio - buscar do banco. A conexão vem do pool e segue com a
+    # requisição (as próximas consultas a reaproveitam); teardown_appcontext a devolve
     try:
         if db_manager.connect():
             # Com o índice idx_precatorios_esta_ordem_valor, esta query é RÁPIDA
             valor = db_manager.get_max_value('valor')
             if valor and valor > 0:
-                _cached_max_valor = valor
-                _cache_timestamp = now
-                logger.info(f"Valor maximo atualizado no cache: {valor}")
+                store_cached_max_valor(valor)
                 return valor
-            db_manager.disconnect()
     except Exception as e:
         logger.warning(f"Erro ao buscar valor maximo, usando cache antigo ou padrao: {e}")
 
@@ -1899,6 +3045,30 @@ def get_cached_max_valor() -> float:
     return _cached_max_valor if _cached_max_valor else 10000000.0
 
 # ===== Normalização/Validação de tipos =====
+@functools.lru_cache(maxsize=4096)
+def parse_brl_amount(s: str) -> Optional[float]:
+    """Converte um valor monetário digitado ('R$ 1.234,56', '1234.56') para float.
+
+    Cacheado: na edição em massa e nos formulários os mesmos textos se repetem muito.
+    """
+    # Caminho rápido: número já no formato 1234.56, sem símbolos nem separador de milhar
+    if _PLAIN_DECIMAL_RE.fullmatch(s):
+        return float(s)
+    # Se houver ambas vírgula e ponto, assume que o último separador é o decimal
+    # Estratégia simples: remove todos os separadores exceto o último caractere [.,]
+    # 1) substitui vírgula por ponto e 2) remove tudo que não seja dígito ou ponto (R$, espaços)
+    s = s.translate(_CURRENCY_CLEAN_TRANSLATE)
+    # 3) se houver múltiplos pontos, mantém somente o último como decimal
+    if s.count('.') > 1:
+        parts = s.split('.')
+        decimal_part = parts.pop()
+        s = ''.join(parts) + '.' + decimal_part
+    # Converte para float para compatibilidade com tipo numeric do banco
+    try:
+        return float(s) if s else None
+    except (ValueError, TypeError):
+        return None
+
 def normalize_field_value(field_name: str, value: Any) -> Any:
     """Normaliza valores de campos para padrões consistentes.
     - ordem, ano_orc: inteiros extraindo somente dígitos
@@ -1914,8 +3084,13 @@ def normalize_field_value(field_name: str, value: Any) -> Any:
         value = value.strip()
 
     if field_name in ('ordem', 'ano_orc'):
+        # Caminho rápido: entrada já limpa (caso comum vindo do formulário)
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.isascii() and value.isdigit():
+            return int(value)
         # Extrai apenas dígitos e converte para int, quando possível
-        digits = re.sub(r"[^0-9]", "", str(value))
+        digits = str(value).translate(_KEEP_DIGITS)
         if digits == '':
             return None
         try:
@@ -1928,24 +3103,7 @@ def normalize_field_value(field_name: str, value: Any) -> Any:
         s = str(value).strip()
         if not s:
             return None
-        # troca vírgula decimal por ponto, remove espaços e R$
-        s = s.replace('R$', '').replace(' ', '')
-        # Se houver ambas vírgula e ponto, assume que o último separador é o decimal
-        # Estratégia simples: remove todos os separadores exceto o último caractere [.,]
-        # 1) substitui vírgula por ponto
-        s = s.replace(',', '.')
-        # 2) remove tudo que não seja dígito ou ponto
-        s = re.sub(r"[^0-9.]", "", s)
-        # 3) se houver múltiplos pontos, mantém somente o último como decimal
-        if s.count('.') > 1:
-            parts = s.split('.')
-            decimal_part = parts.pop()
-            s = ''.join(parts) + '.' + decimal_part
-        # Converte para float para compatibilidade com tipo numeric do banco
-        try:
-            return float(s) if s else None
-        except (ValueError, TypeError):
-            return None
+        return parse_brl_amount(s)
 
     if field_name == 'data_base':
         # Converte string para data se possível
@@ -1964,9 +3122,7 @@ def normalize_field_value(field_name: str, value: Any) -> Any:
 
     if field_name in ('esta_na_ordem', 'nao_esta_na_ordem', 'presenca_no_pipe'):
         # Converte para boolean
-        if isinstance(value, str):
-            return value.lower() in ('true', '1', 'sim', 's', 'yes', 'y')
-        return bool(value)
+        return bool(_to_bool(value))
 
     # Campos de texto comuns
     return value
@@ -1987,6 +3143,14 @@ def serve_static(filename):
 @app.route('/')
 def index():
     """Página principal - otimizada para Vercel"""
+    # Navegação repetida sem gravações desde a última resposta: 304 sem consultar o banco
+    etag = index_etag()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = INDEX_CACHE_CONTROL
+        return response
+
     try:
         if not db_manager.connect():
             logger.error("Falha ao conectar com banco de dados")
@@ -2007,9 +3171,9 @@ def index():
             per_page = int(request.args.get('per_page', 200))
             if per_page < 1:
                 per_page = 200
-            # Limite máximo de 1000 por página para manter boa performance
-            if per_page > 1000:
-                per_page = 1000
+            # Limite máximo por página para manter boa performance
+            if per_page > LIST_MAX_PER_PAGE:
+                per_page = LIST_MAX_PER_PAGE
         except (ValueError, TypeError):
             per_page = 200
         
@@ -2058,25 +3222,6 @@ def index():
         max_valor = get_cached_max_valor()
 
         # Filtros de valor: valor mínimo e valor máximo
-        def _normalize_currency_str(s: str):
-            if not s or not s.strip():
-                return None
-            try:
-                # Remover R$, espaços, e tratar separadores
-                s = s.replace('R$', '').replace(' ', '').strip()
-                
-                # Se tem vírgula, assume que é separador decimal brasileiro
-                # Remove pontos (separadores de milhar) e troca vírgula por ponto
-                if ',' in s:
-                    s = s.replace('.', '').replace(',', '.')
-                # Remove tudo que não é número ou ponto decimal
-                s = re.sub(r"[^0-9.]", "", s)
-                
-                return float(s) if s else None
-            except Exception as e:
-                logger.warning(f"Erro ao normalizar valor: {s} - {e}")
-                return None
-
         # Processar valor mínimo
         raw_valor_min = request.args.get('filter_valor_min', '').strip()
         normalized_valor_min = _normalize_currency_str(raw_valor_min)
@@ -2102,10 +3247,10 @@ def index():
                 # Remover do filters se existir
                 if 'esta_na_ordem' in filters:
                     del filters['esta_na_ordem']
-            elif esta_na_ordem_value.upper() in ('SIM', 'S', 'YES', 'Y', 'TRUE', '1'):
+            elif _to_bool(esta_na_ordem_value) is True:
                 # Usuário selecionou "SIM"
                 filters['esta_na_ordem'] = 'SIM'
-            elif esta_na_ordem_value.upper() in ('NAO', 'NÃO', 'NO', 'N', 'FALSE', '0'):
+            elif _to_bool(esta_na_ordem_value) is False:
                 # Usuário selecionou "NÃO"
                 filters['esta_na_ordem'] = 'NAO'
             else:
@@ -2129,14 +3274,6 @@ def index():
         }
         
         # ORGANIZAÇÃO: Carregar TODAS as organizações (sem limite)
-        try:
-            # Carregar todas as organizações do banco (sem limite)
-            filter_values['organizacao'] = db_manager.get_filter_values('organizacao', use_cache=True, limit_count=None, active_filters=None)
-            logger.info(f"Organização carregada: {len(filter_values['organizacao'])} valores (TODAS)")
-        except Exception as e:
-            logger.warning(f"Erro ao carregar organização: {e}")
-            filter_values['organizacao'] = []
-        
         # OUTROS FILTROS: Carregar baseado em filtros ativos (dinâmico)
         # Se houver filtro de organização aplicado, outros filtros mostram apenas valores dessa organização
         other_fields = ['prioridade', 'tribunal', 'natureza', 'situacao', 'regime', 'ano_orc']
@@ -2149,22 +3286,21 @@ def index():
             elif isinstance(org_filter, str):
                 active_filters_for_dynamic['organizacao'] = org_filter
         
+        filter_specs = {'organizacao': {'use_cache': True, 'limit_count': None, 'active_filters': None}}
         for field in other_fields:
-            try:
-                # Se há filtro de organização, usar ele para filtrar dinamicamente
-                # Caso contrário, carregar valores com cache (mais rápido)
-                # Limitar quantidade para melhor performance inicial
-                limit = 500 if field == 'ano_orc' else None  # Limitar anos se muitos
-                filter_values[field] = db_manager.get_filter_values(
-                    field, 
-                    use_cache=True,  # Sempre usar cache quando possível
-                    limit_count=limit,
-                    active_filters=active_filters_for_dynamic if active_filters_for_dynamic else None
-                )
-                logger.info(f"Filtro {field} carregado: {len(filter_values[field])} valores (cache: True)")
-            except Exception as e:
-                logger.warning(f"Erro ao carregar {field}: {e}")
-                filter_values[field] = []
+            # Sempre usar cache quando possível; limitar anos se muitos
+            filter_specs[field] = {
+                'use_cache': True,
+                'limit_count': 500 if field == 'ano_orc' else None,
+                'active_filters': active_filters_for_dynamic if active_filters_for_dynamic else None
+            }
+        try:
+            # Todos os dropdowns em paralelo (cada um em sua conexão do pool)
+            filter_values.update(db_manager.get_filter_values_batch(filter_specs))
+            for field, values in filter_values.items():
+                logger.info(f"Filtro {field} carregado: {len(values)} valores")
+        except Exception as e:
+            logger.warning(f"Erro ao carregar valores dos filtros: {e}")
         
         # Normalizar filtros ANTES de buscar dados (para garantir que a query SQL funcione corretamente)
         # Mas manter os filtros originais para o template também
@@ -2188,7 +3324,11 @@ def index():
         
         # Obter dados paginados com ordenação (PRIORIDADE MÁXIMA)
         try:
-            result = db_manager.get_precatorios_paginated(page=page, per_page=per_page, filters=filters_for_query, sort_field=sort_field, sort_order=sort_order)
+            # Contagem exata (COUNT(*)) apenas sob demanda: ?exact_count=1
+            exact_count = request.args.get('exact_count') == '1'
+            # Cursor da página anterior (link "Próximo"); números de página usam OFFSET
+            cursor_after = decode_precatorios_cursor(request.args.get('after', ''), sort_field if sort_field in SAFE_SORT_FIELDS else 'ordem')
+            result = db_manager.get_precatorios_paginated(page=page, per_page=per_page, filters=filters_for_query, sort_field=sort_field, sort_order=sort_order, exact_count=exact_count, cursor_after=cursor_after)
             # Calcular acumulativo e PEC 66 (meses) para cada registro
             # OTIMIZAÇÃO: Fazer cálculo apenas se houver poucas organizações únicas (máx 15)
             # Para muitas organizações, inicializar campos como None e carregar página rapidamente
@@ -2214,14 +3354,10 @@ def index():
                     else:
                         logger.warning("enrich_records_with_pec66 retornou lista vazia")
                 except Exception as pec66_error:
-                    logger.warning(f"Cálculo PEC66 falhou: {pec66_error}")
-                    import traceback
-                    logger.warning(f"Traceback: {traceback.format_exc()}")
+                    logger.warning(f"Cálculo PEC66 falhou: {pec66_error}", exc_info=True)
                     # Campos já foram inicializados como None acima
         except Exception as e:
-            logger.error(f"Erro ao buscar precatórios: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception(f"Erro ao buscar precatórios: {e}")
             result = {
                 'data': [],
                 'pagination': {
@@ -2239,35 +3375,6 @@ def index():
         
         # max_valor já foi obtido anteriormente (não buscar novamente)
         
-        # Campos específicos para exibição (ordenados conforme especificação)
-        display_fields = [
-            {'name': 'id', 'label': 'ID', 'type': 'integer', 'editable': False, 'visible': False},
-            {'name': 'precatorio', 'label': 'Precatório', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'ordem', 'label': 'Ordem', 'type': 'integer', 'editable': False, 'visible': True},
-            {'name': 'organizacao', 'label': 'Organização', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'prioridade', 'label': 'Prioridade', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'tribunal', 'label': 'Tribunal', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'natureza', 'label': 'Natureza', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'regime', 'label': 'Regime', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'ano_orc', 'label': 'Ano Orçamentário', 'type': 'integer', 'editable': False, 'visible': True},
-            {'name': 'situacao', 'label': 'Situação', 'type': 'character varying', 'editable': True, 'visible': True},
-            {'name': 'valor', 'label': 'Valor', 'type': 'numeric', 'editable': True, 'visible': True},
-            {'name': 'esta_na_ordem', 'label': 'Está na Ordem', 'type': 'boolean', 'editable': False, 'visible': True},
-            {'name': 'acumulativo_pec66', 'label': 'Valor Acumulado', 'type': 'numeric', 'editable': False, 'visible': True},
-            {'name': 'pec66_resultado_arredondado', 'label': 'Meses', 'type': 'numeric', 'editable': False, 'visible': True},
-            {'name': 'caprec', 'label': 'CAPREC', 'type': 'character varying', 'editable': False, 'visible': True},
-            {'name': 'presenca_no_pipe', 'label': 'No Pipe', 'type': 'boolean', 'editable': False, 'visible': True},
-        ]
-        
-        # Armazenar dados originais para desfazer (simplificado - evitar deepcopy pesado)
-        global original_data
-        try:
-            # Usar dict comprehension simples em vez de deepcopy para melhor performance
-            original_data = {str(p['id']): dict(p) for p in result['data']}
-        except Exception as e:
-            logger.warning(f"Erro ao copiar dados originais: {e}")
-            original_data = {}
-        
         # Informações de ordenação
         sorting = {
             'field': sort_field,
@@ -2306,19 +3413,20 @@ def index():
         # Log detalhado para debug
         logger.info(f"Filtros normalizados para template: {[(k, f'{len(v)} valores: {v}' if isinstance(v, list) else v) for k, v in normalized_filters.items() if k in ['prioridade', 'tribunal', 'natureza', 'situacao', 'regime', 'ano_orc']]}")
 
-        return render_template('index.html',
+        response = make_response(render_template('index.html',
                              precatorios=result['data'],
                              pagination=result['pagination'],
                              filters=normalized_filters,
                              filter_values=filter_values,
-                             display_fields=display_fields,
+                             display_fields=DISPLAY_FIELDS,
                              sorting=sorting,
-                             max_valor=max_valor)
+                             max_valor=max_valor))
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = INDEX_CACHE_CONTROL
+        return response
     
     except Exception as e:
-        logger.error(f"Erro crítico na página principal: {e}")
-        import traceback
-        logger.error(f"Traceback completo: {traceback.format_exc()}")
+        logger.exception(f"Erro crítico na página principal: {e}")
         try:
             flash(f'Erro ao carregar dados: {str(e)[:100]}', 'error')
             try:
@@ -2347,6 +3455,11 @@ def index():
         except:
             pass  # Não deixar erro de desconexão quebrar a resposta
 
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Garante que a conexão global volte ao pool mesmo se a rota não a devolveu"""
+    db_manager.disconnect()
+
 # Handler de erro global para capturar erros não tratados
 @app.errorhandler(404)
 def not_found(error):
@@ -2363,15 +3476,13 @@ def internal_error(error):
 @app.route('/update', methods=['POST'])
 def update_data():
     """Atualiza os dados modificados no banco - otimizado para Vercel"""
-    global modified_data
-    
     try:
         logger.info("=== INÍCIO DA REQUISIÇÃO UPDATE ===")
         
         if not db_manager.connect():
             return jsonify({'success': False, 'message': 'Erro ao conectar com banco'})
         
-        # Obter dados modificados do frontend
+        # Obter dados modificados do frontend (locais à requisição: nada fica no servidor)
         modified_data = request.json.get('data', {})
         logger.info(f"Dados recebidos: {modified_data}")
         
@@ -2382,7 +3493,11 @@ def update_data():
         success_count = 0
         error_count = 0
         errors = []
+        changed_fields = set()
         
+        # Linhas agrupadas pelo conjunto de campos alterados: cada grupo vira um único
+        # UPDATE ... FROM (VALUES ...) com logs em lote (bulk_update_precatorios)
+        groups = defaultdict(list)
         for precatorio_id, updates in modified_data.items():
             # Remover campos que não devem ser atualizados
             filtered_updates = {k: v for k, v in updates.items() 
@@ -2390,24 +3505,37 @@ def update_data():
             # Normalizar valores para padronização de tipos
             filtered_updates = normalize_updates(filtered_updates)
             
-            if filtered_updates:
-                # Obter informações do usuário para logging
-                usuario = request.headers.get('User-Agent', 'Sistema Web')
-                # Limitar tamanho do usuário para evitar erro de campo muito longo
-                if len(usuario) > 100:
-                    usuario = usuario[:97] + '...'
-                ip_address = request.remote_addr
-                
-                if db_manager.update_precatorio(precatorio_id, filtered_updates, 
-                                               usuario=usuario, ip_address=ip_address, 
-                                               user_agent=request.headers.get('User-Agent')):
+            if not filtered_updates:
+                continue
+            try:
+                precatorio_id = int(precatorio_id)
+            except (ValueError, TypeError):
+                error_count += 1
+                errors.append(f"Erro ao atualizar precatório {precatorio_id}")
+                continue
+            if any(value is None for value in filtered_updates.values()):
+                # Campo apagado (NULL): no lote None significa "manter o valor atual"
+                if db_manager.update_precatorio(precatorio_id, filtered_updates):
                     success_count += 1
+                    changed_fields.update(filtered_updates)
                 else:
                     error_count += 1
                     errors.append(f"Erro ao atualizar precatório {precatorio_id}")
+                continue
+            groups[tuple(sorted(filtered_updates))].append({'id': precatorio_id, 'updates': filtered_updates})
         
-        # Limpar dados modificados após atualização
-        modified_data.clear()
+        for group_fields, group_updates in groups.items():
+            result = db_manager.bulk_update_precatorios(group_updates)
+            success_count += result['success_count']
+            group_errors = len(group_updates) - result['success_count']
+            if group_errors:
+                error_count += group_errors
+                errors.append(f"Erro ao atualizar {group_errors} precatório(s) ({', '.join(group_fields)})")
+            if result['success_count']:
+                changed_fields.update(group_fields)
+        
+        if success_count:
+            bump_data_version(changed_fields)
         
         if error_count == 0:
             message = f"Atualização concluída: {success_count} sucessos"
@@ -2423,9 +3551,7 @@ def update_data():
         })
     
     except Exception as e:
-        logger.error(f"Erro na atualização: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erro na atualização: {e}")
         return jsonify({'success': False, 'message': f'Erro interno: {e}'})
     
     finally:
@@ -2450,35 +3576,31 @@ def bulk_update():
         if not selected_ids or not field_updates:
             return jsonify({'success': False, 'message': 'Nenhum registro ou campo selecionado'})
         
+        # Somente colunas conhecidas (os nomes vão para o SQL)
+        invalid_fields = [field for field in field_updates if field not in BULK_UPDATABLE_FIELDS]
+        if invalid_fields:
+            return jsonify({'success': False, 'message': f"Campos inválidos: {', '.join(map(str, invalid_fields))}"})
+        
         # Normalizar valores para padronização de tipos
         normalized_updates = normalize_updates(field_updates)
         
-        # Buscar dados atuais de todos os registros selecionados
-        ids_str = ','.join(map(str, selected_ids))
-        current_query = f"""
-            SELECT id, organizacao, prioridade, tribunal, precatorio, ordem, 
-                   {', '.join(normalized_updates.keys())}
-            FROM {TABLE_NAME} 
-            WHERE id IN ({ids_str})
-        """
-        
-        db_manager.cursor.execute(current_query)
-        current_data_list = db_manager.cursor.fetchall()
+        try:
+            # IDs como inteiros (parâmetros do VALUES) e sem repetição: um id duplicado
+            # geraria logs em dobro para a mesma alteração
+            selected_ids = list(dict.fromkeys(int(precatorio_id) for precatorio_id in selected_ids))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'IDs inválidos'})
         
-        # Preparar dados para atualização em massa
-        updates_data = []
-        for row in current_data_list:
-            updates_data.append({
-                'id': row['id'],
-                'updates': normalized_updates,
-                'current_data': dict(row)
-            })
+        # Preparar dados para atualização em massa (valores anteriores voltam do próprio UPDATE)
+        updates_data = [{'id': precatorio_id, 'updates': normalized_updates} for precatorio_id in selected_ids]
         
         # Executar atualização em massa
         result = db_manager.bulk_update_precatorios(updates_data)
         
         success_count = result['success_count']
         error_count = result['error_count']
+        if success_count:
+            bump_data_version(normalized_updates)
         
         if error_count == 0:
             message = f"Atualização em massa concluída: {success_count} registros atualizados"
@@ -2493,9 +3615,7 @@ def bulk_update():
         })
         
     except Exception as e:
-        logger.error(f"Erro na atualização em massa: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erro na atualização em massa: {e}")
         return jsonify({'success': False, 'message': f'Erro interno: {e}'})
     
     finally:
@@ -2505,14 +3625,15 @@ def bulk_update():
 def get_all_ids():
     """Retorna todos os IDs dos precatórios para seleção em massa"""
     try:
-        if not db_manager.connect():
-            return jsonify({'success': False, 'message': 'Erro ao conectar com banco'})
-        
         # Buscar todos os IDs com filtros aplicados
         filters = {}
         for key, value in request.args.items():
             if key.startswith('filter_') and value:
                 field_name = key.replace('filter_', '')
+                # Somente colunas conhecidas chegam ao SQL (o nome é interpolado na query)
+                if field_name not in ID_SEARCH_FILTER_FIELDS:
+                    logger.warning(f"Filtro ignorado em get_all_ids: {field_name}")
+                    continue
                 filters[field_name] = value
         
         # Aplicar filtro padrão se não especificado
@@ -2520,7 +3641,7 @@ def get_all_ids():
             filters['esta_na_ordem'] = 'SIM'
         
         # Buscar IDs de forma mais eficiente usando query direta
-        # Limitar a 5000 para evitar timeout (ajuste conforme necessário)
+        # Limitar a MAX_IDS_SELECTION para evitar timeout (ajuste conforme necessário)
         try:
             where_conditions = []
             params = []
@@ -2530,11 +3651,11 @@ def get_all_ids():
                 if value:
                     if key == 'esta_na_ordem':
                         where_conditions.append(f"{key} = %s")
-                        params.append(True if str(value).lower() in ('true', '1') else False)
+                        # Não reconhecido: padrão TRUE, como em build_precatorios_list_conditions
+                        params.append(_to_bool(value) is not False)
                     elif key == 'valor':
                         try:
-                            normalized_val = str(value).replace('R$', '').replace(' ', '').replace(',', '.')
-                            normalized_val = re.sub(r"[^0-9.]", "", normalized_val)
+                            normalized_val = str(value).translate(_CURRENCY_CLEAN_TRANSLATE)
                             if normalized_val:
                                 where_conditions.append(f"{key} <= %s")
                                 params.append(float(normalized_val))
@@ -2551,27 +3672,46 @@ def get_all_ids():
                             pass
                     else:
                         # Para outros campos, usar ILIKE
-                        where_conditions.append(f"{key} ILIKE %s")
-                        params.append(f"%{value}%")
+                        where_conditions.append(f"{key} ILIKE %s ESCAPE '\\'")
+                        params.append(f"%{escape_like(value)}%")
             
-            where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            query = f"SELECT id FROM {TABLE_NAME}{where_clause} LIMIT 5000"
+            # Sem nenhum filtro a busca varreria a tabela inteira antes do LIMIT. esta_na_ordem
+            # sempre entra (padrão SIM) e sozinho não restringe a busca: não conta como filtro
+            if all(condition.startswith('esta_na_ordem ') for condition in where_conditions):
+                return jsonify({'success': False, 'message': 'Refine os filtros'}), 400
+
+            # Conexão só depois de validar os filtros
+            if not db_manager.connect():
+                return jsonify({'success': False, 'message': 'Erro ao conectar com banco'})
+
+            where_clause = " WHERE " + " AND ".join(where_conditions)
+            # ORDER BY id: seleção determinística (mesmos IDs a cada clique quando há mais que o limite)
+            query = f"SELECT id FROM {TABLE_NAME}{where_clause} ORDER BY id LIMIT {MAX_IDS_SELECTION}"
             
-            if db_manager.cursor:
-                db_manager.cursor.execute(query, params)
-                results = db_manager.cursor.fetchall()
-                ids = [str(row['id']) for row in results]
+            if db_manager.connection and not db_manager.connection.closed:
+                # COPY ... TO STDOUT: os IDs chegam como texto, um por linha, sem montar
+                # tupla/int por linha no psycopg2 (COPY não aceita parâmetros: mogrify os escapa)
+                with db_manager.transaction(), \
+                        db_manager.connection.cursor(cursor_factory=psycopg2.extensions.cursor) as id_cursor:
+                    # Teto de tempo só para a busca de IDs: SET LOCAL termina com a transação
+                    id_cursor.execute(f"SET LOCAL statement_timeout TO {IDS_STATEMENT_TIMEOUT_MS}")
+                    copy_query = id_cursor.mogrify(query, params).decode('utf-8')
+                    buffer = io.StringIO()
+                    id_cursor.copy_expert(f"COPY ({copy_query}) TO STDOUT", buffer)
+                    ids = buffer.getvalue().split()
             else:
-                raise Exception("Cursor não disponível")
+                raise Exception("Conexão não disponível")
         except Exception as e:
             logger.error(f"Erro ao buscar IDs: {e}")
-            # Fallback para método anterior (limitado)
-            result = db_manager.get_precatorios_paginated(page=1, per_page=5000, filters=filters)
-            ids = [str(row['id']) for row in result['data']]
-        
+            # Sem fallback para get_precatorios_paginated: refazer a busca completa
+            # (COUNT + página de 5000) só multiplicaria o custo para reportar o erro
+            return jsonify({'success': False, 'message': 'Falha ao buscar IDs', 'detail': str(e)}), 500
+
+        # IDs são inteiros: enviar como uma única string separada por vírgulas
+        # (metade do tamanho de um array JSON de strings)
         return jsonify({
             'success': True,
-            'ids': ids,
+            'ids_csv': ','.join(ids),
             'total': len(ids)
         })
         
@@ -2614,13 +3754,14 @@ def logs():
                 filters[field] = value
 
         # Obter valores únicos para os filtros dropdown
-        filter_values = {}
         dropdown_fields = ['organizacao', 'prioridade', 'tribunal', 'campo_modificado', 'precatorio']
-        for field in dropdown_fields:
-            filter_values[field] = db_manager.get_log_filter_values(field)
+        filter_values = db_manager.get_log_filter_values_batch(dropdown_fields)
+
+        # Cursor da página anterior (link "Próximo"); números de página usam OFFSET
+        cursor_after = decode_logs_cursor(request.args.get('after', ''))
 
         # Obter logs do banco de dados
-        result = db_manager.get_logs_paginated(page=page, per_page=per_page, filters=filters)
+        result = db_manager.get_logs_paginated(page=page, per_page=per_page, filters=filters, cursor_after=cursor_after)
 
         logger.info(f"Logs carregados: {len(result['data'])} registros")
         logger.info(f"Total de logs no banco: {result['pagination'].get('total_count', 0)}")
@@ -2632,9 +3773,7 @@ def logs():
                              filter_values=filter_values)
     
     except Exception as e:
-        logger.error(f"Erro na página de logs: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erro na página de logs: {e}")
         flash(f'Erro ao carregar logs: {e}', 'error')
         return render_template('error.html')
     
@@ -2643,7 +3782,8 @@ def logs():
 
 @app.route('/api/export_csv', methods=['GET'])
 def export_csv():
-    """Exporta os dados filtrados para CSV"""
+    """Exporta os dados filtrados para CSV (?raw=1: só colunas do banco, via COPY)"""
+    streaming = False
     try:
         if not db_manager.connect():
             return jsonify({'success': False, 'message': 'Erro ao conectar com banco'}), 500
@@ -2672,19 +3812,6 @@ def export_csv():
                     filters[field] = value
         
         # Processar filtros de valor
-        def _normalize_currency_str(s: str):
-            if not s or not s.strip():
-                return None
-            try:
-                s = s.replace('R$', '').replace(' ', '').strip()
-                if ',' in s:
-                    s = s.replace('.', '').replace(',', '.')
-                s = re.sub(r"[^0-9.]", "", s)
-                return float(s) if s else None
-            except Exception as e:
-                logger.warning(f"Erro ao normalizar valor: {s} - {e}")
-                return None
-
         raw_valor_min = request.args.get('filter_valor_min', '').strip()
         normalized_valor_min = _normalize_currency_str(raw_valor_min)
         if normalized_valor_min is not None and normalized_valor_min > 0:
@@ -2705,165 +3832,119 @@ def export_csv():
         else:
             filters['esta_na_ordem'] = 'SIM'
         
-        # Buscar TODOS os registros (sem paginação) com os filtros aplicados
-        # Usar uma página grande para pegar todos (mas não infinito)
-        result = db_manager.get_precatorios_paginated(page=1, per_page=50000, filters=filters, 
-                                                      sort_field='ordem', sort_order='asc')
+        # Gerar nome do arquivo com timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'precatorios_{timestamp}.csv'
         
-        records = result.get('data', [])
+        if request.args.get('raw') == '1':
+            # Sem as colunas calculadas (PEC 66 / CAPREC): CSV pronto do banco via COPY
+            content = db_manager.copy_precatorios_csv(filters, CSV_EXPORT_MAX_ROWS)
+            if content.count('\n') <= 1:
+                return jsonify({'success': False, 'message': 'Nenhum registro encontrado para exportar'}), 404
+            return Response(
+                '\ufeff' + content,
+                mimetype='text/csv; charset=utf-8',
+                headers={
+                    'Content-Disposition': f'attachment; filename={filename}',
+                    'Content-Type': 'text/csv; charset=utf-8'
+                }
+            )
         
-        if not records:
+        # Registros lidos em lotes por cursor server-side e enviados à medida que ficam prontos:
+        # memória limitada a um lote e primeiro byte sem esperar a exportação inteira
+        batches = db_manager.iter_precatorios_batches(filters, CSV_EXPORT_MAX_ROWS)
+        first_batch = next(batches, None)
+        if not first_batch:
+            batches.close()
             return jsonify({'success': False, 'message': 'Nenhum registro encontrado para exportar'}), 404
         
-        # Calcular PEC 66 e CAPREC para todos os registros (mesma lógica da rota index)
-        if records:
-            try:
-                enrich_records_with_pec66(records, db_manager)
-            except Exception as pec66_error:
-                logger.error(f"Erro ao calcular PEC 66 para CSV: {pec66_error}")
-                # Continuar mesmo com erro nos cálculos
-        
-        # Definir campos para exportação (campos visíveis)
-        export_fields = [
-            {'name': 'precatorio', 'label': 'Precatório'},
-            {'name': 'ordem', 'label': 'Ordem'},
-            {'name': 'organizacao', 'label': 'Organização'},
-            {'name': 'prioridade', 'label': 'Prioridade'},
-            {'name': 'tribunal', 'label': 'Tribunal'},
-            {'name': 'natureza', 'label': 'Natureza'},
-            {'name': 'regime', 'label': 'Regime'},
-            {'name': 'ano_orc', 'label': 'Ano Orçamentário'},
-            {'name': 'situacao', 'label': 'Situação'},
-            {'name': 'valor', 'label': 'Valor'},
-            {'name': 'acumulativo_pec66', 'label': 'Valor Acumulado'},
-            {'name': 'pec66_resultado_arredondado', 'label': 'Meses'},
-            {'name': 'caprec', 'label': 'CAPREC'},
-            {'name': 'presenca_no_pipe', 'label': 'No Pipe'},
-        ]
-        
-        # Criar CSV em memória
-        import io
-        output = io.StringIO()
-        
-        # Escrever cabeçalho
-        headers = [field['label'] for field in export_fields]
-        writer = csv.writer(output, delimiter=';', lineterminator='\n')
-        writer.writerow(headers)
+        def release():
+            # Fecha o cursor nomeado (rollback na própria conexão) antes de devolvê-la ao pool;
+            # idempotente: roda no fim do stream e de novo no fechamento da resposta
+            batches.close()
+            db_manager.disconnect()
         
-        # Escrever dados
-        for record in records:
-            row = []
-            for field in export_fields:
-                value = record.get(field['name'])
+        def generate():
+            try:
+                # Acumulativos por organização calculados uma vez para todos os lotes
+                acumulativo_cache = {}
+                output = io.StringIO()
+                writer = csv.writer(output, delimiter=';', lineterminator='\n')
+                # BOM para UTF-8 (para Excel abrir corretamente) + cabeçalho
+                output.write('\ufeff')
+                writer.writerow([field['label'] for field in EXPORT_FIELDS])
                 
-                # Formatar valores
-                if value is None:
-                    row.append('')
-                elif field['name'] == 'valor' or field['name'] == 'acumulativo_pec66':
-                    # Formatar como número brasileiro
+                batch = first_batch
+                while batch:
+                    # Calcular PEC 66 e CAPREC (mesma lógica da rota index)
                     try:
-                        if isinstance(value, str):
-                            value = float(value.replace(',', '.'))
-                        formatted = f"{float(value):,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.')
-                        row.append(formatted)
-                    except:
-                        row.append(str(value))
-                elif field['name'] == 'presenca_no_pipe':
-                    row.append('Sim' if value else 'Não')
-                elif field['name'] == 'pec66_resultado_arredondado':
-                    row.append(str(int(value)) if value is not None else '')
-                else:
-                    row.append(str(value))
-            
-            writer.writerow(row)
-        
-        # Preparar resposta
-        output.seek(0)
-        csv_data = output.getvalue()
-        output.close()
+                        enrich_records_with_pec66(batch, db_manager, acumulativo_cache)
+                    except Exception as pec66_error:
+                        logger.error(f"Erro ao calcular PEC 66 para CSV: {pec66_error}")
+                        # Continuar mesmo com erro nos cálculos
+                    writer.writerows(format_export_row(record) for record in batch)
+                    yield output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+                    batch = next(batches, None)
+            finally:
+                release()
         
-        # Gerar nome do arquivo com timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'precatorios_{timestamp}.csv'
-        
-        # Retornar CSV
+        # A conexão fica com o stream: devolvida por release(), não pelo finally da rota
         response = Response(
-            csv_data,
+            stream_with_context(generate()),
             mimetype='text/csv; charset=utf-8',
             headers={
                 'Content-Disposition': f'attachment; filename={filename}',
                 'Content-Type': 'text/csv; charset=utf-8'
             }
         )
-        
-        # Adicionar BOM para UTF-8 (para Excel abrir corretamente)
-        response.data = '\ufeff' + csv_data
-        
+        # Resposta fechada sem o stream ter começado (cliente desconectou antes do primeiro byte)
+        response.call_on_close(release)
+        streaming = True
         return response
         
     except Exception as e:
-        logger.error(f"Erro ao exportar CSV: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erro ao exportar CSV: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
     
     finally:
-        db_manager.disconnect()
+        if not streaming:
+            db_manager.disconnect()
 
 @app.route('/undo', methods=['POST'])
 def undo_changes():
-    """Desfaz as alterações não salvas"""
-    global original_data, modified_data
-    
-    try:
-        # Limpar dados modificados
-        modified_data.clear()
-        
-        return jsonify({
-            'success': True,
-            'message': 'Alterações desfeitas com sucesso'
-        })
-    
-    except Exception as e:
-        logger.error(f"Erro ao desfazer alterações: {e}")
-        return jsonify({
-            'success': False,
-            'message': f'Erro ao desfazer alterações: {e}'
-        })
+    """Desfaz as alterações não salvas.
+
+    As edições pendentes vivem só no navegador (enviadas inteiras no /update); não há
+    estado no servidor para limpar, o que vale também entre workers/instâncias.
+    """
+    return jsonify({
+        'success': True,
+        'message': 'Alterações desfeitas com sucesso'
+    })
 
 @app.route('/refresh', methods=['POST'])
 def refresh_data():
     """Recarrega os dados da página"""
-    try:
-        return jsonify({
-            'success': True,
-            'message': 'Dados recarregados com sucesso'
-        })
-    
-    except Exception as e:
-        logger.error(f"Erro ao recarregar dados: {e}")
-        return jsonify({
-            'success': False,
-            'message': f'Erro ao recarregar dados: {e}'
-        })
+    return jsonify({
+        'success': True,
+        'message': 'Dados recarregados com sucesso'
+    })
 
 @app.route('/api/debug/structure', methods=['GET'])
 def debug_table_structure():
     """Rota de diagnóstico para verificar estrutura da tabela"""
     try:
-        if not db_manager.connect():
-            return jsonify({'success': False, 'message': 'Erro ao conectar com banco'})
-        
+        # get_table_structure serve do snapshot e só conecta quando ele expira
         structure = db_manager.get_table_structure()
+        if not structure:
+            return jsonify({'success': False, 'message': 'Erro ao obter estrutura da tabela'})
         return jsonify({
             'success': True,
             'structure': structure,
             'columns': list(structure.keys()),
-            'current_fields_in_code': [
-                'id', 'precatorio', 'ordem', 'organizacao', 'prioridade', 'tribunal', 
-                'natureza', 'data_base', 'situacao', 'esta_na_ordem', 
-                'nao_esta_na_ordem', 'ano_orc', 'valor', 'presenca_no_pipe', 'regime'
-            ]
+            'current_fields_in_code': list(PRECATORIO_LIST_FIELDS)
         })
     except Exception as e:
         logger.error(f"Erro ao obter estrutura: {e}")
@@ -2875,9 +3956,8 @@ def debug_table_structure():
 def debug_quick():
     """Endpoint de verificação rápida: total de linhas, min/max de valor e amostra."""
     try:
-        if not db_manager.connect():
-            return jsonify({'ok': False, 'message': 'Erro ao conectar com banco'}), 500
-        result = db_manager.get_quick_stats()
+        # get_quick_stats serve do snapshot e só conecta quando ele expira (?exact=1 conta de verdade)
+        result = db_manager.get_quick_stats(exact=request.args.get('exact') == '1')
         status = 200 if result.get('ok') else 500
         return jsonify(result), status
     except Exception as e:
@@ -2889,13 +3969,15 @@ def debug_quick():
 def admin_apply_indexes():
     """Aplica índices recomendados. Protegido por token simples via ENV ADMIN_TOKEN."""
     token = request.args.get('token') or request.headers.get('X-Admin-Token')
-    if token != ADMIN_TOKEN:
+    # Rejeitar token ausente/de tamanho errado antes da comparação em tempo constante
+    if not token or len(token) != len(ADMIN_TOKEN) or not hmac.compare_digest(token, ADMIN_TOKEN):
         return jsonify({'success': False, 'message': 'Não autorizado'}), 401
 
     try:
         if not db_manager.connect():
             return jsonify({'success': False, 'message': 'Erro ao conectar com banco'}), 500
-        result = db_manager.apply_optimization_indexes()
+        which = request.args.get('which') or None
+        result = db_manager.apply_optimization_indexes(which=which)
         return jsonify(result), (200 if result.get('success') else 500)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -2950,9 +4032,8 @@ def debug_pec66():
         db_manager.cursor.execute(query)
         records = db_manager.cursor.fetchall()
         
-        # Calcular PEC 66 para esses registros
-        test_records = [dict(r) for r in records]
-        calculated = calculate_pec66_for_records(test_records)
+        # Calcular PEC 66 para esses registros (RealDictRow é um dict: alterado no lugar, sem cópia)
+        calculated = calculate_pec66_for_records(records)
         
         return jsonify({
             'success': True,
@@ -2962,8 +4043,7 @@ def debug_pec66():
             'first_record_keys': list(calculated[0].keys()) if calculated else []
         })
     except Exception as e:
-        import traceback
-        logger.error(f"Erro no debug PEC 66: {e}\n{traceback.format_exc()}")
+        logger.exception(f"Erro no debug PEC 66: {e}")
         return jsonify({
             'success': False,
             'message': str(e),
@@ -2986,16 +4066,25 @@ def pec66_page():
 @app.route('/api/get_filter_options', methods=['GET'])
 def get_filter_options():
     """API para carregar opções de filtro DINÂMICAS baseadas em filtros ativos"""
+    # Revalidação condicional: se o navegador já tem a versão atual desta consulta,
+    # responder 304 sem abrir conexão com o banco
+    cache_key = request.query_string.decode('utf-8', 'ignore')
+    cached_etag = _filter_options_etags.get(cache_key)
+    if cached_etag and (time.monotonic() - cached_etag[1]) < FILTER_OPTIONS_MAX_AGE:
+        if request.if_none_match.contains(cached_etag[0]):
+            response = Response(status=304)
+            response.set_etag(cached_etag[0])
+            response.headers['Cache-Control'] = FILTER_OPTIONS_CACHE_CONTROL
+            return response
+
+    # Campo inválido é rejeitado antes de tocar no pool de conexões
+    field = request.args.get('field', '')
+    if field not in FILTER_OPTIONS_FIELDS:
+        return jsonify({'success': False, 'message': 'Campo inválido'}), 400
+
     # Criar uma nova conexão para cada requisição (evita problemas com requisições paralelas)
     local_db = DatabaseManager()
     try:
-        if not local_db.connect():
-            return jsonify({'success': False, 'message': 'Erro ao conectar com banco'}), 500
-        
-        field = request.args.get('field', '')
-        if field not in ['organizacao', 'prioridade', 'tribunal', 'natureza', 'situacao', 'regime', 'ano_orc']:
-            return jsonify({'success': False, 'message': 'Campo inválido'}), 400
-        
         # Permitir limite opcional e busca incremental
         limit = request.args.get('limit', None)
         limit_count = int(limit) if limit and limit.isdigit() else None
@@ -3012,26 +4101,71 @@ def get_filter_options():
             if filter_value:
                 active_filters[filter_field] = filter_value
         
+        # Cache de valores por (campo, filtros ativos), invalidado nas gravações: um acerto
+        # responde sem pegar conexão do pool
+        needs_db = search_term is not None or get_cached_filter_values(
+            filter_values_cache_key(field, active_filters or None)) is None
+        if needs_db and not local_db.connect():
+            return jsonify({'success': False, 'message': 'Erro ao conectar com banco'}), 500
+        
         # Usar estratégia dinâmica com filtros ativos
-        values = local_db.get_filter_values(field, use_cache=False, limit_count=limit_count, search_term=search_term, active_filters=active_filters if active_filters else None)
+        values = local_db.get_filter_values(field, limit_count=limit_count, search_term=search_term, active_filters=active_filters if active_filters else None)
         
         logger.info(f"API DINÂMICA: Retornando {len(values)} valores para {field} (filtros ativos: {len(active_filters)})")
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'field': field,
             'values': values,
             'count': len(values),
             'has_more': limit_count is not None and len(values) == limit_count
         })
+        # ETag derivado dos valores retornados + cache no navegador
+        etag = hashlib.blake2b(json.dumps([field, values], ensure_ascii=False).encode('utf-8'), digest_size=8).hexdigest()
+        with _filter_values_lock:
+            _filter_options_etags[cache_key] = (etag, time.monotonic())
+            _filter_options_etags.move_to_end(cache_key)
+            while len(_filter_options_etags) > FILTER_VALUES_CACHE_MAXSIZE:
+                _filter_options_etags.popitem(last=False)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = FILTER_OPTIONS_CACHE_CONTROL
+        # Se o cliente já tinha esses mesmos valores (ETag expirado só no servidor), responde 304 sem corpo
+        return response.make_conditional(request)
     except Exception as e:
-        logger.error(f"Erro ao obter opções de filtro: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.exception(f"Erro ao obter opções de filtro: {e}")
         return jsonify({'success': False, 'message': str(e)}), 500
     finally:
         local_db.disconnect()
 
+# Dropdowns pequenos pré-carregados em segundo plano a partir da primeira requisição do
+# processo (não na importação: testes e ferramentas não abrem conexão, e o cold start não
+# disputa o pool). Opcional: PRELOAD_FILTER_VALUES=1 liga
+PRELOAD_FILTER_VALUES = os.environ.get('PRELOAD_FILTER_VALUES', '0') == '1'
+_preload_started = False
+_preload_lock = threading.Lock()
+
+def preload_small_filter_values() -> None:
+    """Carrega os campos pequenos (sem filtros ativos) no cache de valores de filtro"""
+    try:
+        with DatabaseManager() as preload_db:
+            values = preload_db.get_all_filter_values(list(FILTER_VALUES_FUSABLE_FIELDS))
+        logger.info(f"Dropdowns pré-carregados: {sum(len(v) for v in values.values())} valores")
+    except Exception as e:
+        logger.warning(f"Pré-carga dos dropdowns falhou (serão carregados sob demanda): {e}")
+
+@app.before_request
+def start_filter_values_preload():
+    """Dispara a pré-carga uma única vez por processo, na primeira requisição"""
+    global _preload_started
+    if not PRELOAD_FILTER_VALUES or _preload_started:
+        return
+    with _preload_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+    # Thread daemon: não segura o encerramento do processo se o banco estiver lento
+    threading.Thread(target=preload_small_filter_values, name='preload-filter-values', daemon=True).start()
+
 # Configuração específica para Vercel
 if __name__ == "__main__":
     # Para desenvolvimento local
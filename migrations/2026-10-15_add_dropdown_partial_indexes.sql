@@ -0,0 +1,17 @@
+-- Partial indexes backing the dropdown queries in get_filter_values
+-- (SELECT <campo> ... WHERE esta_na_ordem = TRUE AND <campo> IS NOT NULL GROUP BY <campo>),
+-- replacing the old SET enable_seqscan = off hint.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=<campo>_ordem_partial
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_organizacao_partial ON precatorios(organizacao) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_prioridade_partial ON precatorios(prioridade) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_tribunal_partial ON precatorios(tribunal) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_natureza_partial ON precatorios(natureza) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_regime_partial ON precatorios(regime) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_situacao_partial ON precatorios(situacao) WHERE esta_na_ordem = TRUE;
+
+-- Keep planner statistics fresh without manual ANALYZE
+ALTER TABLE precatorios SET (autovacuum_analyze_scale_factor = 0.02);
+
+ANALYZE precatorios;
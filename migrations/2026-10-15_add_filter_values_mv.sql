@@ -0,0 +1,25 @@
+-- Dropdown values (get_filter_values / get_all_filter_values without active filters) served from a
+-- pre-aggregated materialized view instead of a DISTINCT/GROUP BY over precatorios.
+-- pos keeps each field's native ordering (ano_orc numeric, text collation for the others).
+-- The unique index allows REFRESH ... CONCURRENTLY (readers are not blocked).
+-- Refresh daily, e.g. pg_cron:
+--   SELECT cron.schedule('refresh_mv_filter_values', '0 3 * * *',
+--                        'REFRESH MATERIALIZED VIEW CONCURRENTLY mv_filter_values_precatorios');
+-- Also available via /admin/apply_indexes?which=filter_values_mv (creates on first run, refreshes afterwards)
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_filter_values_precatorios AS
+SELECT 'prioridade'::text AS field, prioridade::text AS value, count(*) AS total, row_number() OVER (ORDER BY prioridade) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND prioridade IS NOT NULL GROUP BY prioridade
+UNION ALL
+SELECT 'tribunal'::text AS field, tribunal::text AS value, count(*) AS total, row_number() OVER (ORDER BY tribunal) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND tribunal IS NOT NULL GROUP BY tribunal
+UNION ALL
+SELECT 'natureza'::text AS field, natureza::text AS value, count(*) AS total, row_number() OVER (ORDER BY natureza) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND natureza IS NOT NULL GROUP BY natureza
+UNION ALL
+SELECT 'regime'::text AS field, regime::text AS value, count(*) AS total, row_number() OVER (ORDER BY regime) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND regime IS NOT NULL GROUP BY regime
+UNION ALL
+SELECT 'situacao'::text AS field, situacao::text AS value, count(*) AS total, row_number() OVER (ORDER BY situacao) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND situacao IS NOT NULL GROUP BY situacao
+UNION ALL
+SELECT 'ano_orc'::text AS field, ano_orc::text AS value, count(*) AS total, row_number() OVER (ORDER BY ano_orc) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND ano_orc IS NOT NULL GROUP BY ano_orc
+UNION ALL
+SELECT 'organizacao'::text AS field, organizacao::text AS value, count(*) AS total, row_number() OVER (ORDER BY organizacao) AS pos FROM precatorios WHERE esta_na_ordem = TRUE AND organizacao IS NOT NULL GROUP BY organizacao;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_filter_values_field_value ON mv_filter_values_precatorios(field, value);
+REFRESH MATERIALIZED VIEW CONCURRENTLY mv_filter_values_precatorios;
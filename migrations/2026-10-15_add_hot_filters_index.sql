@@ -0,0 +1,11 @@
+-- Composite partial index for the most common filter combination
+-- (organizacao + tribunal + ano_orc + faixa de valor, sempre com esta_na_ordem = TRUE).
+-- INCLUDE (id) enables an index-only scan for the SELECT id used by /api/get_all_ids.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=hot_filters
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_hot
+    ON precatorios(organizacao, tribunal, ano_orc, valor) INCLUDE (id)
+    WHERE esta_na_ordem = TRUE;
+
+ANALYZE precatorios;
@@ -0,0 +1,8 @@
+-- /api/get_all_ids: SELECT id FROM precatorios WHERE esta_na_ordem = TRUE ... ORDER BY id LIMIT n
+-- Partial index on id so the default selection is an ordered index-only scan.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=id_ordem_partial
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_ordem_true_id ON precatorios(id) WHERE esta_na_ordem = TRUE;
+
+ANALYZE precatorios;
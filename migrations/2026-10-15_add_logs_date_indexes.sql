@@ -0,0 +1,13 @@
+-- Indexes for get_logs_paginated (ORDER BY data_modificacao DESC LIMIT n).
+-- The date filters are half-open ranges on the bare column
+-- (data_modificacao >= :inicio AND data_modificacao < :fim + 1 day), so these
+-- indexes can be walked backwards and stop after one page.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- idx_precatorios_logs_data_desc is superseded by idx_precatorios_logs_data_id_desc
+-- (2026-10-15_logs_keyset_index.sql), which drops it; run that file too.
+-- Also available via /admin/apply_indexes?which=logs_data_id_desc / logs_organizacao_data
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_logs_data_desc ON precatorios_logs(data_modificacao DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_logs_organizacao_data ON precatorios_logs(organizacao, data_modificacao DESC);
+
+ANALYZE precatorios_logs;
@@ -0,0 +1,9 @@
+-- Keyset pagination for the main listing (get_precatorios_paginated, sort by ordem):
+--   WHERE esta_na_ordem = TRUE AND (ordem, id) > (:last_ordem, :last_id) ORDER BY ordem, id LIMIT n
+-- The id tie-breaker is also part of the OFFSET pages' ORDER BY, so both walk the same sequence.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=ordem_id_ordem_partial
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_ordem_id ON precatorios(ordem, id) WHERE esta_na_ordem = TRUE;
+
+ANALYZE precatorios;
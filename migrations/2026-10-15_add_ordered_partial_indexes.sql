@@ -0,0 +1,11 @@
+-- Partial indexes aligned with ORDER BY on the esta_na_ordem = TRUE subset:
+--  * ano_orc: dropdown / loose index scan in get_all_filter_values (the other
+--    dropdown fields are covered by 2026-10-15_add_dropdown_partial_indexes.sql)
+--  * valor DESC NULLS LAST: get_max_value becomes a single index entry fetch
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=ano_orc_ordem_partial / valor_desc_ordem_partial
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_ano_orc_partial ON precatorios(ano_orc) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_valor_desc ON precatorios(valor DESC NULLS LAST) WHERE esta_na_ordem = TRUE AND valor IS NOT NULL;
+
+ANALYZE precatorios;
@@ -0,0 +1,11 @@
+-- Keyset pagination when sorting by valor / ano_orc (get_precatorios_paginated):
+--   WHERE esta_na_ordem = TRUE AND (valor, id) > (:last_valor, :last_id) ORDER BY valor, id LIMIT n
+-- NULL sort values are paged by id in a separate segment (valor IS NULL AND id > :last_id).
+-- Descending sorts scan the same indexes backwards.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=valor_id_ordem_partial / ano_orc_id_ordem_partial
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_valor_id ON precatorios(valor, id) WHERE esta_na_ordem = TRUE;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precs_ord_ano_orc_id ON precatorios(ano_orc, id) WHERE esta_na_ordem = TRUE;
+
+ANALYZE precatorios;
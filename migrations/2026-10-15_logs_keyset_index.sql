@@ -0,0 +1,11 @@
+-- Keyset pagination for get_logs_paginated:
+--   WHERE (data_modificacao, id) < (:last_data, :last_id) ORDER BY data_modificacao DESC, id DESC LIMIT n
+-- Replaces idx_precatorios_logs_data_desc (2026-10-15_add_logs_date_indexes.sql), whose
+-- single column cannot serve the id tie-breaker.
+-- CONCURRENTLY cannot run inside a transaction block: run this file without BEGIN/COMMIT.
+-- Also available via /admin/apply_indexes?which=logs_data_id_desc
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_precatorios_logs_data_id_desc ON precatorios_logs(data_modificacao DESC, id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS idx_precatorios_logs_data_desc;
+
+ANALYZE precatorios_logs;
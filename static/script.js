@@ -577,6 +577,7 @@ function sortByField(field) {
     urlParams.set('sort', field);
     urlParams.set('order', newOrder);
     urlParams.set('page', '1'); // Voltar para primeira página
+    urlParams.delete('after'); // Cursor de paginação vale só para a ordenação anterior
     
     // Redirecionar com novos parâmetros
     window.location.href = window.location.pathname + '?' + urlParams.toString();
@@ -688,8 +689,9 @@ function selectAllPages() {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            addIdsToSelection(data.ids);
-            showAlert(`Selecionados ${data.ids.length} registros de todas as páginas`, 'success');
+            const ids = data.ids_csv ? data.ids_csv.split(',') : [];
+            addIdsToSelection(ids);
+            showAlert(`Selecionados ${ids.length} registros de todas as páginas`, 'success');
         } else {
             showAlert('Erro ao carregar IDs: ' + data.message, 'danger');
         }
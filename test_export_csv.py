@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Teste da exportação CSV em streaming: a conexão só volta ao pool depois do último lote.
+
+Usa um pool falso (sem banco): python -m unittest test_export_csv
+"""
+
+import unittest
+from unittest import mock
+
+import psycopg2
+import app
+
+
+class FakeNamedCursor:
+    def __init__(self, events, rows):
+        self.events = events
+        self.rows = list(rows)
+        self.description = [('id',), ('ordem',), ('organizacao',)]
+        self.itersize = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.events.append('named_cursor_closed')
+        return False
+
+    def execute(self, query, params=None):
+        self.events.append('execute')
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        if batch:
+            self.events.append('fetch')
+        return batch
+
+
+class FakeCursor:
+    closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, events, rows):
+        self.events = events
+        self.rows = rows
+        self.autocommit = True
+        self.info = mock.Mock(transaction_status=psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+
+    def cursor(self, name=None, cursor_factory=None):
+        if name:
+            return FakeNamedCursor(self.events, self.rows)
+        return FakeCursor()
+
+    def commit(self):
+        self.events.append('commit')
+
+    def rollback(self):
+        self.events.append('rollback')
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.events = connection.events
+
+    def getconn(self):
+        self.events.append('getconn')
+        return self.connection
+
+    def putconn(self, connection, close=False):
+        self.events.append('putconn')
+
+
+class ExportCsvStreamingTest(unittest.TestCase):
+    def test_multi_batch_export_keeps_connection_until_last_chunk(self):
+        events = []
+        batch_size = 3
+        rows = [(i, i, 'ORG') for i in range(1, 3 * batch_size + 2)]
+        pool = FakePool(FakeConnection(events, rows))
+        connected_during_enrich = []
+
+        def fake_enrich(records, db_manager, acumulativo_cache=None):
+            connected_during_enrich.append(db_manager.connection is not None)
+            events.append('enrich')
+            return records
+
+        with mock.patch.object(app, 'get_db_pool', return_value=pool), \
+                mock.patch.object(app, 'enrich_records_with_pec66', side_effect=fake_enrich), \
+                mock.patch.object(app.DatabaseManager.iter_precatorios_batches, '__defaults__', (batch_size,)):
+            client = app.app.test_client()
+            response = client.get('/api/export_csv')
+            self.assertEqual(response.status_code, 200)
+            # Nada devolvido ao pool antes do primeiro chunk
+            self.assertNotIn('putconn', events)
+            body = response.get_data(as_text=True)
+            response.close()
+
+        # Cabeçalho + uma linha por registro, sem corte no meio
+        self.assertEqual(len(body.strip().splitlines()), len(rows) + 1)
+        self.assertEqual(connected_during_enrich, [True] * 4)
+        self.assertIn('commit', events)
+        self.assertNotIn('rollback', events)
+        # Conexão devolvida uma única vez, depois do último lote e do fechamento do cursor
+        self.assertEqual(events.count('putconn'), 1)
+        self.assertGreater(events.index('putconn'), len(events) - 1 - events[::-1].index('enrich'))
+        self.assertLess(events.index('named_cursor_closed'), events.index('putconn'))
+
+
+if __name__ == '__main__':
+    unittest.main()
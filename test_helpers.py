@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Testes das funções puras de app.py (sem banco): python -m unittest test_helpers"""
+
+import unittest
+from datetime import date
+from decimal import Decimal
+
+import app
+
+
+class PrecatoriosCursorTest(unittest.TestCase):
+    def test_round_trip_for_each_sort_field(self):
+        cases = [
+            ('ordem', {'id': 7, 'ordem': 42}, (42, 7)),
+            ('ano_orc', {'id': 8, 'ano_orc': 2025}, (2025, 8)),
+            ('valor', {'id': 9, 'valor': Decimal('1234.56')}, (Decimal('1234.56'), 9)),
+        ]
+        for sort_field, row, expected in cases:
+            with self.subTest(sort_field=sort_field):
+                cursor = app.encode_precatorios_cursor(row, sort_field)
+                self.assertEqual(app.decode_precatorios_cursor(cursor, sort_field), expected)
+
+    def test_null_sort_value_round_trips_as_none(self):
+        cursor = app.encode_precatorios_cursor({'id': 5, 'valor': None}, 'valor')
+        self.assertEqual(cursor, '_5')
+        self.assertEqual(app.decode_precatorios_cursor(cursor, 'valor'), (None, 5))
+
+    def test_invalid_cursor_decodes_to_none(self):
+        for value in ['', '42', 'abc_7', '42_x', None]:
+            with self.subTest(value=value):
+                self.assertIsNone(app.decode_precatorios_cursor(value, 'ordem'))
+        self.assertIsNone(app.decode_precatorios_cursor('1_2', 'organizacao'))
+
+
+class PrecatoriosListQueryTest(unittest.TestCase):
+    where = ('esta_na_ordem = TRUE',)
+
+    def test_offset_query_without_keyset(self):
+        query = app.build_precatorios_list_query(self.where, 'ordem', 'ASC')
+        self.assertIn('WHERE esta_na_ordem = TRUE ORDER BY ordem ASC, id ASC LIMIT %s OFFSET %s', query)
+
+    def test_keyset_segments(self):
+        cases = [
+            ('after', 'ASC', '(valor, id) > (%s, %s)'),
+            ('after', 'DESC', '(valor, id) < (%s, %s)'),
+            ('null_after', 'ASC', 'valor IS NULL AND id > %s'),
+            ('null_after', 'DESC', 'valor IS NULL AND id < %s'),
+            ('nulls', 'ASC', 'valor IS NULL'),
+            ('not_null', 'DESC', 'valor IS NOT NULL'),
+        ]
+        for keyset, order, condition in cases:
+            with self.subTest(keyset=keyset, order=order):
+                query = app.build_precatorios_list_query(self.where, 'valor', order, keyset)
+                self.assertIn(f'WHERE esta_na_ordem = TRUE AND {condition} ORDER BY', query)
+                self.assertTrue(query.endswith(f'ORDER BY valor {order}, id {order} LIMIT %s'))
+                self.assertNotIn('OFFSET', query)
+
+    def test_segments_follow_postgres_null_placement(self):
+        # ASC: NULLs por último; DESC: NULLs primeiro
+        self.assertEqual(app.KEYSET_SEGMENTS[('ASC', False)], ('after', 'nulls'))
+        self.assertEqual(app.KEYSET_SEGMENTS[('ASC', True)], ('null_after',))
+        self.assertEqual(app.KEYSET_SEGMENTS[('DESC', False)], ('after',))
+        self.assertEqual(app.KEYSET_SEGMENTS[('DESC', True)], ('null_after', 'not_null'))
+
+
+class ToBoolTest(unittest.TestCase):
+    def test_booleans_pass_through(self):
+        self.assertIs(app._to_bool(True), True)
+        self.assertIs(app._to_bool(False), False)
+
+    def test_text_is_classified(self):
+        for value in ['SIM', 'sim', ' s ', 'TRUE', '1', 'yes', 'Verdadeiro', 1]:
+            with self.subTest(value=value):
+                self.assertIs(app._to_bool(value), True)
+        for value in ['NÃO', 'nao', 'N', 'false', '0', 'no', 'falso', 0]:
+            with self.subTest(value=value):
+                self.assertIs(app._to_bool(value), False)
+
+    def test_unrecognized_is_none(self):
+        for value in [None, '', 'TODOS', [], 0.0]:
+            with self.subTest(value=value):
+                self.assertIsNone(app._to_bool(value))
+
+
+class ParseBrlAmountTest(unittest.TestCase):
+    def test_formats(self):
+        cases = [
+            ('1234.56', 1234.56),
+            ('1234', 1234.0),
+            ('R$ 1.234,56', 1234.56),
+            ('1.234.567,89', 1234567.89),
+            ('1234,5', 1234.5),
+            ('R$', None),
+            ('', None),
+        ]
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(app.parse_brl_amount(text), expected)
+
+
+class NormalizeFieldValueTest(unittest.TestCase):
+    def test_integer_fields_keep_only_digits(self):
+        self.assertEqual(app.normalize_field_value('ordem', ' 123 '), 123)
+        self.assertEqual(app.normalize_field_value('ordem', 45), 45)
+        self.assertEqual(app.normalize_field_value('ano_orc', '2.025'), 2025)
+        self.assertIsNone(app.normalize_field_value('ano_orc', 'abc'))
+
+    def test_valor(self):
+        self.assertEqual(app.normalize_field_value('valor', 'R$ 1.234,56'), 1234.56)
+        self.assertIsNone(app.normalize_field_value('valor', '   '))
+
+    def test_data_base(self):
+        for text in ['2024-03-01', '01/03/2024', '01-03-2024']:
+            with self.subTest(text=text):
+                self.assertEqual(app.normalize_field_value('data_base', text), date(2024, 3, 1))
+        self.assertEqual(app.normalize_field_value('data_base', 'sem data'), 'sem data')
+
+    def test_boolean_fields(self):
+        self.assertIs(app.normalize_field_value('esta_na_ordem', 'Sim'), True)
+        self.assertIs(app.normalize_field_value('presenca_no_pipe', 'não'), False)
+        self.assertIs(app.normalize_field_value('nao_esta_na_ordem', True), True)
+
+    def test_text_and_none(self):
+        self.assertEqual(app.normalize_field_value('situacao', '  Pago '), 'Pago')
+        self.assertIsNone(app.normalize_field_value('situacao', None))
+
+
+if __name__ == '__main__':
+    unittest.main()